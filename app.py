@@ -9,23 +9,52 @@ single-page frontend in static/index.html.
 
 import io
 import re
+import gzip
+import hashlib
 import difflib
 import logging
+import multiprocessing
+import os
+import shutil
 import subprocess
+import tempfile
 import threading
 import time
-import json
-import urllib.error
+import uuid
+import http.client
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from collections import defaultdict
-from functools import wraps
+from collections import OrderedDict, defaultdict
+from functools import lru_cache, wraps
+from typing import Iterable, Iterator
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, send_from_directory
 from werkzeug.utils import secure_filename
+import orjson
 import pdfplumber
+from pdfminer.pdfparser import PDFSyntaxError
+from pdfminer.psparser import PSException
+
+try:
+    # pdfplumber >= 0.11.5 wraps every pdfminer error in this
+    from pdfplumber.utils.exceptions import PdfminerException
+except ImportError:
+    PdfminerException = PSException
+
+try:
+    import pypdfium2 as pdfium  # optional C-backed engine (PDF_ENGINE=pdfium)
+    import pypdfium2.raw as pdfium_c
+except ImportError:
+    pdfium = pdfium_c = None
+
+try:
+    import regex as _regex  # optional: real per-match timeouts for ignore patterns
+except ImportError:
+    _regex = None
 
 import config
-from llm import generate_llm_report
+from llm import generate_llm_report, prewarm as prewarm_llm
 
 # ---------------------------------------------------------------------------
 # Version
@@ -56,6 +85,29 @@ app.config["MAX_CONTENT_LENGTH"] = config.MAX_UPLOAD_MB * 1024 * 1024
 logger = logging.getLogger(__name__)
 
 
+# JSON bodies at least this large are gzip-compressed when the client
+# accepts it; diff text (unified_diff, report, lines_table) shrinks ~10x
+_GZIP_MIN_BYTES = 1024
+_GZIP_LEVEL = 5
+
+
+def _json_response(obj, status: int = 200) -> Response:
+    """Serialise *obj* with orjson into a fully-buffered JSON response.
+
+    Used for every JSON response in place of jsonify.  The body is encoded
+    once up front so the response carries an exact Content-Length (no
+    chunked framing, and the browser can show progress), and large bodies
+    are gzipped for clients that accept it.
+    """
+    payload = orjson.dumps(obj)
+    headers = {"Vary": "Accept-Encoding"}
+    if len(payload) >= _GZIP_MIN_BYTES and "gzip" in request.headers.get("Accept-Encoding", ""):
+        payload = gzip.compress(payload, compresslevel=_GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+    headers["Content-Length"] = str(len(payload))
+    return Response(payload, status=status, mimetype="application/json", headers=headers)
+
+
 @app.after_request
 def add_security_headers(response):
     """Add Content Security Policy header to all responses."""
@@ -82,12 +134,12 @@ def _check_origin():
         parsed = urlparse(origin)
         origin_host = parsed.netloc
         if origin_host != host:
-            return jsonify({"error": "Origin mismatch."}), 403
+            return _json_response({"error": "Origin mismatch."}, 403)
     elif referer:
         parsed = urlparse(referer)
         ref_host = parsed.netloc
         if ref_host != host:
-            return jsonify({"error": "Referer mismatch."}), 403
+            return _json_response({"error": "Referer mismatch."}, 403)
     return None
 
 _rate_limits = {}
@@ -105,7 +157,7 @@ def rate_limit(max_requests, window_seconds):
             
             if len(timestamps) >= max_requests:
                 _rate_limits[key] = timestamps
-                return jsonify({"error": "Rate limit exceeded. Please wait and try again."}), 429
+                return _json_response({"error": "Rate limit exceeded. Please wait and try again."}, 429)
             
             timestamps.append(now)
             _rate_limits[key] = timestamps
@@ -124,41 +176,299 @@ def rate_limit(max_requests, window_seconds):
 
 # Sentinel character sequence injected between pages during text extraction.
 # It is stripped before any user-facing output but allows internal functions
-# to map diff blocks back to their source page numbers.
+# to map diff blocks back to their source page numbers.  NUL never survives
+# extraction in real text, so hot loops identify sentinels by their first
+# character alone (``line and line[0] == _MARKER_CHAR``).
 PAGE_MARKER_PREFIX = "\x00PAGE:"
+_MARKER_CHAR = PAGE_MARKER_PREFIX[0]
 
 
 # ---------------------------------------------------------------------------
 # PDF parsing
 # ---------------------------------------------------------------------------
 
-def extract_text_and_metadata(pdf_bytes: bytes) -> tuple[list[str], dict]:
-    """Open a PDF once and return both its text lines and metadata dict.
+# Documents with more pages than this have their pages split across the
+# extraction pool, one contiguous range per worker; smaller ones are
+# extracted by a single worker.
+_PARALLEL_PAGE_THRESHOLD = 50
+
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+# PDFium is not thread-safe, so in-process calls into it are serialised
+_pdfium_lock = threading.Lock()
+
+
+def _get_extract_pool():
+    """Return the shared extraction/word-diff process pool, creating it lazily.
+
+    Returns None when parallel extraction is disabled or when called from
+    inside a pool worker (workers never fan out further).
+    """
+    global _extract_pool
+    if config.EXTRACT_WORKERS <= 1 or multiprocessing.parent_process() is not None:
+        return None
+    with _extract_pool_lock:
+        if _extract_pool is None:
+            _extract_pool = ProcessPoolExecutor(max_workers=config.EXTRACT_WORKERS)
+        return _extract_pool
+
+
+def _discard_extract_pool(pool) -> None:
+    """Drop *pool* after one of its workers died (OOM, a crash in C code).
+
+    A broken ProcessPoolExecutor fails every later submission, so it is
+    shut down and the next _get_extract_pool() call starts a fresh one.
+    Nothing happens if another request already replaced it.
+    """
+    global _extract_pool
+    with _extract_pool_lock:
+        if pool is None or _extract_pool is not pool:
+            return
+        _extract_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _iter_pages(pages) -> Iterator[str]:
+    """Yield text lines from pdfplumber pages, inserting page sentinels."""
+    for page in pages:
+        # Insert a sentinel so we know where each page starts
+        yield f"{PAGE_MARKER_PREFIX}{page.page_number}"
+        text = page.extract_text() or ""
+        # Drop the page's cached layout objects so memory stays bounded
+        # by one page rather than growing with the whole document
+        page.close()
+        yield from _page_text_lines(text)
+
+
+def _page_text_lines(text: str) -> list[str]:
+    """Split one page's extracted text into lines."""
+    if _MARKER_CHAR in text:
+        # Keep the sentinel's first character unique to sentinels
+        text = text.replace(_MARKER_CHAR, "")
+    return text.splitlines()
+
+
+def _iter_pdfium_pages(source, start: int = 0, end: int | None = None) -> Iterator[str]:
+    """Like _iter_pages(), but extracting pages [start, end) with PDFium.
+
+    *source* is PDF bytes or a seekable binary stream; PDFium reads streams
+    in place (seeking before every read), so uploads are not copied.
+
+    Pages where PDFium finds no text despite having text objects are
+    retried with pdfplumber, whose layout analysis copes with some fonts
+    PDFium cannot map.  Image-only (scanned) pages have no text objects and
+    are skipped without the fallback, which could not find text either.
+    """
+    try:
+        with _pdfium_lock:
+            doc = pdfium.PdfDocument(source)
+    except pdfium.PdfiumError as e:
+        raise ValueError(f"PDFium could not open the document: {e}") from e
+
+    # pdfminer expects to own the stream position, so the (rare) pdfplumber
+    # fallback parses its own in-memory copy
+    plumber = None
+    try:
+        if end is None:
+            end = len(doc)
+        for index in range(start, end):
+            with _pdfium_lock:
+                page = doc[index]
+                textpage = page.get_textpage()
+                text = textpage.get_text_range()
+                textpage.close()
+                retry = not text.strip() and next(
+                    page.get_objects(filter=[pdfium_c.FPDF_PAGEOBJ_TEXT]), None) is not None
+                page.close()
+            if retry:
+                if plumber is None:
+                    plumber = pdfplumber.open(io.BytesIO(_pdf_bytes(source)))
+                plumber_page = plumber.pages[index]
+                text = plumber_page.extract_text() or ""
+                plumber_page.close()
+            yield f"{PAGE_MARKER_PREFIX}{index + 1}"
+            yield from _page_text_lines(text)
+    finally:
+        if plumber is not None:
+            plumber.close()
+        with _pdfium_lock:
+            doc.close()
+
+
+def _use_pdfium() -> bool:
+    """True when PDF_ENGINE selects PDFium and pypdfium2 is importable."""
+    return config.PDF_ENGINE == "pdfium" and pdfium is not None
+
+
+def _extract_page_range(pdf_bytes: bytes, start: int, end: int) -> list[str]:
+    """Pool worker: extract pages [start, end) of a PDF (0-based)."""
+    if _use_pdfium():
+        return list(_iter_pdfium_pages(pdf_bytes, start, end))
+    # pdfplumber's page filter is 1-based and skips building the other pages
+    with pdfplumber.open(io.BytesIO(pdf_bytes), pages=list(range(start + 1, end + 1))) as pdf:
+        return list(_iter_pages(pdf.pages))
+
+
+def _open_pdf(source):
+    """Open *source* — PDF bytes or a seekable binary stream — with pdfplumber.
+
+    Streams (e.g. an upload's spooled temp file) are read in place rather
+    than copied into a bytes object first.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return pdfplumber.open(io.BytesIO(source))
+    source.seek(0)
+    return pdfplumber.open(source)
+
+
+def _pdf_bytes(source) -> bytes:
+    """Return the contents of *source* (PDF bytes or a seekable stream)."""
+    if isinstance(source, (bytes, bytearray)):
+        return source
+    source.seek(0)
+    return source.read()
+
+
+def _read_pdf_info(source) -> tuple[int, dict]:
+    """Return (page_count, raw metadata dict) for a PDF."""
+    if _use_pdfium():
+        try:
+            with _pdfium_lock:
+                doc = pdfium.PdfDocument(source)
+                try:
+                    return len(doc), doc.get_metadata_dict()
+                finally:
+                    doc.close()
+        except pdfium.PdfiumError as e:
+            raise ValueError(f"PDFium could not open the document: {e}") from e
+    with _open_pdf(source) as pdf:
+        return len(pdf.pages), pdf.metadata or {}
+
+
+def _start_extraction(source) -> tuple[list[Future] | None, dict]:
+    """Read metadata and schedule text extraction of a PDF.
+
+    *source* is PDF bytes or a seekable binary stream.  Returns
+    (futures, metadata) where the futures resolve, in page order, to lists
+    of text lines, or are None when extraction happens lazily in this
+    process.  Scheduling both documents before consuming either lets them
+    be extracted concurrently.
+    """
+    page_count, meta = _read_pdf_info(source)
+    metadata = {
+        "title": _sanitize_metadata_value(meta.get("Title", "") or ""),
+        "author": _sanitize_metadata_value(meta.get("Author", "") or ""),
+        "subject": _sanitize_metadata_value(meta.get("Subject", "") or ""),
+        "creator": _sanitize_metadata_value(meta.get("Creator", "") or ""),
+        "producer": _sanitize_metadata_value(meta.get("Producer", "") or ""),
+        "creation_date": _sanitize_metadata_value(meta.get("CreationDate", "") or ""),
+        "mod_date": _sanitize_metadata_value(meta.get("ModDate", "") or ""),
+        "page_count": page_count,
+    }
+
+    pool = _get_extract_pool()
+    if pool is None:
+        return None, metadata
+
+    # Workers need their own copy of the document
+    pdf_bytes = _pdf_bytes(source)
+    # One contiguous range per worker: every task pickles the whole PDF
+    # to its process, so fewer, larger tasks keep that copying bounded
+    tasks = min(config.EXTRACT_WORKERS, page_count) if page_count > _PARALLEL_PAGE_THRESHOLD else 1
+    bounds = [page_count * k // tasks for k in range(tasks + 1)]
+    futures = [
+        pool.submit(_extract_page_range, pdf_bytes, start, end)
+        for start, end in zip(bounds, bounds[1:])
+    ]
+    return futures, metadata
+
+
+def iter_lines(source, futures: list[Future] | None = None) -> Iterator[str]:
+    """Yield a PDF's text lines page by page, including page sentinels.
+
+    *futures* are the pending results from _start_extraction; each chunk is
+    released as soon as it has been consumed.  Without futures the pages
+    of *source* (bytes or a seekable stream) are extracted lazily in this
+    process.
+    """
+    if futures is None:
+        if _use_pdfium():
+            yield from _iter_pdfium_pages(source)
+            return
+        with _open_pdf(source) as pdf:
+            yield from _iter_pages(pdf.pages)
+        return
+    while futures:
+        yield from futures.pop(0).result()
+
+
+def extract_text_and_metadata(source) -> tuple[list[str], dict]:
+    """Open a PDF and return both its text lines and metadata dict.
 
     Text lines include page-boundary sentinels (PAGE_MARKER_PREFIX + page_no)
     so downstream functions can determine which page a line belongs to.
     Metadata includes standard fields (title, author, dates …) plus page count.
+    Large documents are extracted in parallel across the process pool.
+    *source* is PDF bytes or a seekable binary stream.
     """
-    lines: list[str] = []
-    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
-        for page in pdf.pages:
-            # Insert a sentinel so we know where each page starts
-            lines.append(f"{PAGE_MARKER_PREFIX}{page.page_number}")
-            text = page.extract_text() or ""
-            lines.extend(text.splitlines())
-
-        meta = pdf.metadata or {}
-        metadata = {
-            "title": _sanitize_metadata_value(meta.get("Title", "") or ""),
-            "author": _sanitize_metadata_value(meta.get("Author", "") or ""),
-            "subject": _sanitize_metadata_value(meta.get("Subject", "") or ""),
-            "creator": _sanitize_metadata_value(meta.get("Creator", "") or ""),
-            "producer": _sanitize_metadata_value(meta.get("Producer", "") or ""),
-            "creation_date": _sanitize_metadata_value(meta.get("CreationDate", "") or ""),
-            "mod_date": _sanitize_metadata_value(meta.get("ModDate", "") or ""),
-            "page_count": len(pdf.pages),
-        }
-    return lines, metadata
+    futures, metadata = _start_extraction(source)
+    return list(iter_lines(source, futures)), metadata
+
+
+# Extracted (lines, metadata) by SHA-256 of the PDF, most recently used
+# last, holding up to config.EXTRACT_CACHE_SIZE documents.  Re-running a
+# comparison with different ignore rules — or with one of the same files —
+# then skips pdfplumber entirely.  (SHA-256 measured faster than blake2b
+# on hardware with SHA extensions.)
+_extract_cache: OrderedDict[str, tuple[list[str], dict]] = OrderedDict()
+_extract_cache_lock = threading.Lock()
+
+
+def _pdf_digest(source) -> str:
+    """Return the SHA-256 hex digest of PDF bytes or a seekable stream."""
+    if isinstance(source, (bytes, bytearray)):
+        return hashlib.sha256(source).hexdigest()
+    source.seek(0)
+    digest = hashlib.file_digest(source, "sha256").hexdigest()
+    source.seek(0)
+    return digest
+
+
+def _start_cached_extraction(source, key: str | None = None) -> tuple[Iterable[str], dict]:
+    """_start_extraction() + iter_lines(), served from the cache when possible.
+
+    *key* is the source's _pdf_digest(), if the caller already has it.
+    Returns (lines, metadata).  On a miss *lines* is a lazy iterator that
+    records the document in the cache once it has been fully consumed.
+    """
+    if config.EXTRACT_CACHE_SIZE <= 0:
+        futures, metadata = _start_extraction(source)
+        return iter_lines(source, futures), metadata
+
+    if key is None:
+        key = _pdf_digest(source)
+    with _extract_cache_lock:
+        hit = _extract_cache.get(key)
+        if hit is not None:
+            _extract_cache.move_to_end(key)
+            return hit
+
+    futures, metadata = _start_extraction(source)
+    return _record_extraction(key, iter_lines(source, futures), metadata), metadata
+
+
+def _record_extraction(key: str, lines: Iterable[str], metadata: dict) -> Iterator[str]:
+    """Pass *lines* through, caching the complete list under *key* at the end."""
+    collected: list[str] = []
+    for line in lines:
+        collected.append(line)
+        yield line
+    with _extract_cache_lock:
+        _extract_cache[key] = (collected, metadata)
+        _extract_cache.move_to_end(key)
+        while len(_extract_cache) > config.EXTRACT_CACHE_SIZE:
+            _extract_cache.popitem(last=False)
 
 
 def _sanitize_metadata_value(value) -> str:
@@ -179,36 +489,179 @@ def _sanitize_metadata_value(value) -> str:
 # Page-marker helpers
 # ---------------------------------------------------------------------------
 
-def _is_page_marker(line: str) -> bool:
-    """Return True if *line* is a page-boundary sentinel, not real content."""
-    return line.startswith(PAGE_MARKER_PREFIX)
-
-
 def _page_number_from_marker(line: str) -> int:
     """Extract the integer page number from a page-boundary sentinel."""
     return int(line[len(PAGE_MARKER_PREFIX):])
 
 
-def _build_page_index(lines: list[str]) -> list[int]:
-    """Pre-compute a list that maps every line index to its page number.
+def _split_page_markers(lines: list[str]) -> tuple[list[str], list[int]]:
+    """Strip page sentinels from *lines* in a single pass.
 
-    This replaces a previous O(n) backward walk with an O(1) lookup per
-    line, significantly improving performance for large documents.
+    Returns (text, page_of) where text holds only content lines and
+    page_of[i] is the page number of text[i].
     """
-    page_index: list[int] = []
+    text: list[str] = []
+    page_of: list[int] = []
     current_page = 1
     for line in lines:
-        if _is_page_marker(line):
+        if line and line[0] == _MARKER_CHAR:
             current_page = _page_number_from_marker(line)
-        page_index.append(current_page)
-    return page_index
+            continue
+        text.append(line)
+        page_of.append(current_page)
+    return text, page_of
 
 
 # ---------------------------------------------------------------------------
 # Ignore rules
 # ---------------------------------------------------------------------------
 
+# Header/footer detector, compiled once at import time.  One alternation
+# so each line costs a single regex call:
+#   bare page numbers like "12", "– 5 –", etc.
+#   "Page 3" or "Page 3 of 10"
+# Both tolerate surrounding whitespace, so lines needn't be stripped first.
+_HF_RE = re.compile(r'[-–—\s]*\d+[-–—\s]*|\s*page\s+\d+(?:\s+of\s+\d+)?\s*', re.IGNORECASE)
+
+
+# Limits on user-supplied ignore patterns (ReDoS mitigation).  A repeated
+# group that contains a quantifier or an alternation at any depth — (a+)+,
+# ((a+))+, (.*a){20}, (a|aa)+ — is the classic catastrophic-backtracking
+# shape; _has_nested_quantifier() finds it.
+_MAX_IGNORE_PATTERN_LEN = 500
+_MAX_IGNORE_PATTERN_COMPLEXITY = 20
+_BRACE_QUANTIFIER_RE = re.compile(r'\{(\d*)(,?)(\d*)\}')
+# Per-line match budget when the optional `regex` package is installed
+_IGNORE_MATCH_TIMEOUT = 0.05
+
+_REGEX_ERRORS = (re.error,) if _regex is None else (re.error, _regex.error)
+
+
+def _quantifier_at(pattern: str, i: int) -> tuple[int, bool] | None:
+    """Return (length, repeats) for a quantifier starting at pattern[i], or None.
+
+    *repeats* is True when the quantifier allows more than one repetition
+    (+, *, {n,}, {n,m} with m > 1, {n} with n > 1).
+    """
+    c = pattern[i:i + 1]
+    if c in ("+", "*"):
+        return 1, True
+    if c == "?":
+        return 1, False
+    if c == "{":
+        m = _BRACE_QUANTIFIER_RE.match(pattern, i)
+        if m and (m.group(1) or m.group(3)):
+            low, comma, high = m.groups()
+            repeats = (not high or int(high) > 1) if comma else int(low) > 1
+            return m.end() - i, repeats
+    return None
+
+
+def _has_nested_quantifier(pattern: str) -> bool:
+    """True if a repeated group in *pattern* contains a quantifier or an
+    alternation at any depth.
+
+    Escapes and character classes are skipped, and the ``?`` that opens an
+    extension group (``(?:``, ``(?P<name>``) is not taken for a quantifier.
+    """
+    # One entry per open group: whether it contains a quantifier or "|"
+    risky = [False]
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "\\":
+            i += 2
+        elif c == "[":
+            i += 1
+            if pattern.startswith("^", i):
+                i += 1
+            if pattern.startswith("]", i):
+                i += 1  # a leading "]" is a literal
+            while i < n and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+        elif c == "(":
+            risky.append(False)
+            i += 2 if pattern.startswith("(?", i) else 1
+        elif c == ")" and len(risky) > 1:
+            inner = risky.pop()
+            i += 1
+            quantifier = _quantifier_at(pattern, i)
+            if quantifier is not None:
+                length, repeats = quantifier
+                if repeats and inner:
+                    return True
+                inner = True  # a quantified group is a quantifier in its parent
+                i += length
+            risky[-1] = risky[-1] or inner
+        elif c == "|":
+            risky[-1] = True
+            i += 1
+        else:
+            quantifier = _quantifier_at(pattern, i)
+            if quantifier is None:
+                i += 1
+            else:
+                risky[-1] = True
+                i += quantifier[0]
+    return False
+
+
+def _ignore_pattern_error(pattern: str) -> str | None:
+    """Return why *pattern* is refused as an ignore rule, or None if it is usable.
+
+    Invalid regexes are not an error here; filter_lines() simply skips them.
+    """
+    if len(pattern) > _MAX_IGNORE_PATTERN_LEN:
+        return f"Ignore pattern must be at most {_MAX_IGNORE_PATTERN_LEN} characters."
+    if _has_nested_quantifier(pattern):
+        return ("Ignore pattern repeats a group containing a quantifier or alternation, "
+                "which can hang the matcher.")
+    try:
+        compiled = _compile_ignore(pattern)
+    except _REGEX_ERRORS:
+        return None
+    complexity = compiled.groups + pattern.count("+") + pattern.count("*")
+    if complexity > _MAX_IGNORE_PATTERN_COMPLEXITY:
+        return "Ignore pattern is too complex."
+    return None
+
+
+@lru_cache(maxsize=64)
+def _compile_ignore(pattern: str):
+    """Compile a user-supplied ignore pattern, caching across requests."""
+    if _regex is not None:
+        return _regex.compile(pattern)
+    return re.compile(pattern)
+
+
+def _ignore_fullmatch(user_re, line: str) -> bool:
+    """Return True if *line* fully matches *user_re*, giving up after a timeout.
+
+    Timed-out matches count as non-matching so the line is kept.
+    """
+    if _regex is not None:
+        try:
+            return user_re.fullmatch(line, timeout=_IGNORE_MATCH_TIMEOUT) is not None
+        except TimeoutError:
+            return False
+
+    # Stdlib re has no timeout, so run the match on a thread we can abandon
+    match_result = [None]
+    def _do_match():
+        match_result[0] = user_re.fullmatch(line)
+    t = threading.Thread(target=_do_match, daemon=True)
+    t.start()
+    t.join(timeout=2)
+    return not t.is_alive() and match_result[0] is not None
+
+
 def apply_ignore_rules(lines: list[str], ignore_options: dict) -> list[str]:
+    """List-returning wrapper around filter_lines()."""
+    return list(filter_lines(lines, ignore_options))
+
+
+def filter_lines(lines: Iterable[str], ignore_options: dict) -> Iterator[str]:
     """Filter/transform extracted lines according to user-selected rules.
 
     Supported options (all optional, default False / empty):
@@ -219,61 +672,181 @@ def apply_ignore_rules(lines: list[str], ignore_options: dict) -> list[str]:
                                common headers/footers
 
     Page-marker sentinels are always preserved regardless of rules.
+    Lines are consumed and yielded lazily, so this can be chained directly
+    onto iter_lines() without materialising the unfiltered document.
     """
-    result: list[str] = []
+    ignore_whitespace = ignore_options.get("ignore_whitespace")
+    ignore_case = ignore_options.get("ignore_case")
+    ignore_headers_footers = ignore_options.get("ignore_headers_footers")
+    _join_words = " ".join
+
+    # Resolve the user pattern once rather than per line.  Patterns refused
+    # by _ignore_pattern_error() (ReDoS risk) and invalid ones are ignored.
+    user_re = None
+    pattern = ignore_options.get("ignore_pattern")
+    if pattern and _ignore_pattern_error(pattern) is None:
+        try:
+            user_re = _compile_ignore(pattern)
+        except _REGEX_ERRORS:
+            pass  # invalid regex — skip pattern filtering entirely
+
     for line in lines:
         # Never filter out page-boundary sentinels
-        if _is_page_marker(line):
-            result.append(line)
+        if line and line[0] == _MARKER_CHAR:
+            yield line
             continue
 
-        if ignore_options.get("ignore_whitespace"):
-            line = " ".join(line.split())
+        if ignore_whitespace:
+            # split()/join() stays in C and measured 4-6x faster than a
+            # compiled r"\s+" sub() plus strip() on typical PDF lines
+            line = _join_words(line.split())
 
-        if ignore_options.get("ignore_case"):
+        if ignore_case:
             line = line.lower()
 
-        if ignore_options.get("ignore_pattern"):
-            try:
-                pattern = ignore_options["ignore_pattern"]
-                # Reject very long patterns to mitigate ReDoS risk
-                if len(pattern) > 500:
-                    pass
-                else:
-                    # Use a thread-based timeout to guard against catastrophic backtracking
-                    match_result = [None]
-                    def _do_match():
-                        try:
-                            match_result[0] = re.fullmatch(pattern, line, flags=0)
-                        except re.error:
-                            pass
-                    t = threading.Thread(target=_do_match, daemon=True)
-                    t.start()
-                    t.join(timeout=2)
-                    if t.is_alive():
-                        pass  # timed out — skip filtering for this line
-                    elif match_result[0]:
-                        continue
-            except (re.error, Exception):
-                pass  # invalid regex — skip filtering for this line
-
-        if ignore_options.get("ignore_headers_footers"):
-            stripped = line.strip()
-            # Bare page numbers like "12", "– 5 –", etc.
-            if re.fullmatch(r'[-–—\s]*\d+[-–—\s]*', stripped):
-                continue
-            # "Page 3" or "Page 3 of 10"
-            if re.fullmatch(r'page\s+\d+(\s+of\s+\d+)?', stripped, re.IGNORECASE):
+        if user_re is not None and _ignore_fullmatch(user_re, line):
+            continue
+
+        if ignore_headers_footers:
+            if _HF_RE.fullmatch(line):
                 continue
 
-        result.append(line)
-    return result
+        yield line
 
 
 # ---------------------------------------------------------------------------
 # Diff computation
 # ---------------------------------------------------------------------------
 
+# Edit-distance budget for the Myers line diff.  Beyond this the O(D²)
+# trace grows too large and we fall back to difflib.SequenceMatcher.
+_MYERS_MAX_EDITS = 2000
+
+# Word-diff batches at least this large are farmed out to the process pool
+_PARALLEL_WORD_PAIRS = 32
+_WORD_PAIRS_PER_TASK = 64
+
+
+def _myers_matching_blocks(a: list, b: list, max_edits: int):
+    """Return matching blocks (i, j, size) of a minimal Myers O(ND) diff.
+
+    Returns None if the edit distance exceeds *max_edits*.
+    """
+    n, m = len(a), len(b)
+    max_d = min(max_edits, n + m)
+    offset = max_d + 1
+    # v[offset + k] holds the furthest x reached on diagonal k
+    v = [0] * (2 * max_d + 3)
+    trace: list[list[int]] = []
+    for d in range(max_d + 1):
+        # Keep only diagonals -d-1 … d+1, which is all backtracking needs
+        trace.append(v[offset - d - 1:offset + d + 2])
+        for k in range(-d, d + 1, 2):
+            kk = offset + k
+            if k == -d or (k != d and v[kk - 1] < v[kk + 1]):
+                x = v[kk + 1]           # step down (insertion)
+            else:
+                x = v[kk - 1] + 1       # step right (deletion)
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[kk] = x
+            if x >= n and y >= m:
+                return _myers_backtrack(trace, n, m)
+    return None
+
+
+def _myers_backtrack(trace: list[list[int]], x: int, y: int) -> list[tuple[int, int, int]]:
+    """Walk the Myers trace backwards from (x, y) collecting diagonal snakes."""
+    blocks: list[tuple[int, int, int]] = []
+    for d in range(len(trace) - 1, -1, -1):
+        if d == 0:
+            prev_x = prev_y = mid_x = 0
+        else:
+            vd = trace[d]
+            k = x - y
+            base = d + 1   # index of diagonal 0 within this trace slice
+            if k == -d or (k != d and vd[base + k - 1] < vd[base + k + 1]):
+                prev_k = k + 1
+                prev_x = vd[base + prev_k]
+                mid_x = prev_x
+            else:
+                prev_k = k - 1
+                prev_x = vd[base + prev_k]
+                mid_x = prev_x + 1
+            prev_y = prev_x - prev_k
+        if x > mid_x:
+            blocks.append((mid_x, mid_x - (x - y), x - mid_x))
+        x, y = prev_x, prev_y
+    blocks.reverse()
+    return blocks
+
+
+def _intern_pair(a: list[str], b: list[str]) -> tuple[list[int], list[int]]:
+    """Map each distinct line of *a* and *b* to a small int id.
+
+    The line diff only tests lines for equality, so it can compare and hash
+    these ids instead of long strings.  Opcode indices are unchanged.
+    """
+    id_of: dict[str, int] = {}
+    return ([id_of.setdefault(line, len(id_of)) for line in a],
+            [id_of.setdefault(line, len(id_of)) for line in b])
+
+
+def _line_opcodes(a: list, b: list) -> list[tuple[str, int, int, int, int]]:
+    """Diff two line lists, returning difflib-style (tag, i1, i2, j1, j2) opcodes.
+
+    Uses a minimal Myers diff, falling back to difflib.SequenceMatcher when
+    the documents differ by more than _MYERS_MAX_EDITS lines or when
+    config.DIFF_ALGORITHM is "difflib".
+    """
+    a, b = _intern_pair(a, b)
+
+    # Revised documents usually share a long preamble and postamble; trim
+    # the common prefix/suffix so the matcher only sees the middle
+    la, lb = len(a), len(b)
+    p = 0
+    while p < la and p < lb and a[p] == b[p]:
+        p += 1
+    s = 0
+    while s < la - p and s < lb - p and a[la - 1 - s] == b[lb - 1 - s]:
+        s += 1
+    mid_a, mid_b = a[p:la - s], b[p:lb - s]
+
+    opcodes: list[tuple[str, int, int, int, int]] = []
+    if p:
+        opcodes.append(("equal", 0, p, 0, p))
+
+    blocks = None
+    if config.DIFF_ALGORITHM != "difflib":
+        blocks = _myers_matching_blocks(mid_a, mid_b, _MYERS_MAX_EDITS)
+    if blocks is None:
+        # autojunk=False avoids SequenceMatcher's heuristic that can ignore
+        # frequently repeated lines, producing more accurate diffs on large docs
+        middle = difflib.SequenceMatcher(None, mid_a, mid_b, autojunk=False).get_opcodes()
+        opcodes.extend((tag, i1 + p, i2 + p, j1 + p, j2 + p) for tag, i1, i2, j1, j2 in middle)
+    else:
+        # Same rules as SequenceMatcher.get_opcodes(): a gap on both sides
+        # between two matching blocks is reported as a single replace
+        i = j = 0
+        for ai, bj, size in blocks + [(len(mid_a), len(mid_b), 0)]:
+            if i < ai and j < bj:
+                opcodes.append(("replace", i + p, ai + p, j + p, bj + p))
+            elif i < ai:
+                opcodes.append(("delete", i + p, ai + p, j + p, bj + p))
+            elif j < bj:
+                opcodes.append(("insert", i + p, ai + p, j + p, bj + p))
+            i, j = ai + size, bj + size
+            if size:
+                opcodes.append(("equal", ai + p, i + p, bj + p, j + p))
+
+    if s:
+        opcodes.append(("equal", la - s, la, lb - s, lb))
+    return opcodes
+
+
+
 def compute_diff(lines_a: list[str], lines_b: list[str]):
     """Compare two line arrays and return (diff_blocks, stats).
 
@@ -290,38 +863,36 @@ def compute_diff(lines_a: list[str], lines_b: list[str]):
     Page-marker sentinels are excluded from the diff itself but used to
     determine page numbers for each block.
     """
-    # Pre-compute page index for O(1) lookups
-    page_index_a = _build_page_index(lines_a)
-    page_index_b = _build_page_index(lines_b)
-
-    # Build content-only lists for diffing, keeping original indices for
-    # page lookup afterwards
-    content_a = [(i, l) for i, l in enumerate(lines_a) if not _is_page_marker(l)]
-    content_b = [(i, l) for i, l in enumerate(lines_b) if not _is_page_marker(l)]
-
-    text_a = [l for _, l in content_a]
-    text_b = [l for _, l in content_b]
-
-    # autojunk=False avoids SequenceMatcher's heuristic that can ignore
-    # frequently repeated lines, producing more accurate diffs on large docs
-    matcher = difflib.SequenceMatcher(None, text_a, text_b, autojunk=False)
-    opcodes = matcher.get_opcodes()
+    # Single pass per document: strip sentinels and record each content
+    # line's page number in a parallel list for O(1) lookups
+    text_a, page_of_a = _split_page_markers(lines_a)
+    text_b, page_of_b = _split_page_markers(lines_b)
+    return compute_content_diff(text_a, page_of_a, text_b, page_of_b)
+
+
+def compute_content_diff(text_a: list[str], page_of_a: list[int],
+                         text_b: list[str], page_of_b: list[int]):
+    """compute_diff() for content lines already split by _split_page_markers()."""
+    if text_a == text_b:
+        # Identical documents (e.g. the same file uploaded twice) are a
+        # pathological case for SequenceMatcher — skip it entirely
+        opcodes = [("equal", 0, len(text_a), 0, len(text_b))] if text_a else []
+    else:
+        opcodes = _line_opcodes(text_a, text_b)
 
     diff_blocks: list[dict] = []
     stats = {"equal": 0, "insert": 0, "delete": 0, "replace": 0}
+    # Line pairs from every replace block, word-diffed in one batch below
+    replace_blocks: list[dict] = []
+    word_pairs: list[tuple[str, str]] = []
 
     for tag, i1, i2, j1, j2 in opcodes:
         left_lines_text = text_a[i1:i2]
-        right_lines_text = text_b[j1:j2]
+        # Equal runs hold the same lines on both sides; share one slice
+        right_lines_text = left_lines_text if tag == "equal" else text_b[j1:j2]
 
-        # Word-level diffs give finer granularity inside replace blocks
-        word_diffs = None
-        if tag == "replace":
-            word_diffs = compute_word_diffs(left_lines_text, right_lines_text)
-
-        # Map content indices back to original line indices for page lookup
-        left_page = page_index_a[content_a[i1][0]] if i1 < len(content_a) else None
-        right_page = page_index_b[content_b[j1][0]] if j1 < len(content_b) else None
+        left_page = page_of_a[i1] if i1 < len(page_of_a) else None
+        right_page = page_of_b[j1] if j1 < len(page_of_b) else None
 
         block: dict = {
             "tag": tag,
@@ -334,23 +905,69 @@ def compute_diff(lines_a: list[str], lines_b: list[str]):
             "left_page": left_page,
             "right_page": right_page,
         }
-        if word_diffs is not None:
-            block["word_diffs"] = word_diffs
+        if tag == "replace":
+            replace_blocks.append(block)
+            word_pairs.extend(_pair_lines(left_lines_text, right_lines_text))
         diff_blocks.append(block)
 
-        # Accumulate statistics
-        if tag == "equal":
-            stats["equal"] += i2 - i1
-        elif tag == "insert":
-            stats["insert"] += j2 - j1
-        elif tag == "delete":
-            stats["delete"] += i2 - i1
-        elif tag == "replace":
-            stats["replace"] += max(i2 - i1, j2 - j1)
+        # Accumulate statistics.  One side of an insert/delete is empty and
+        # both sides of an equal run match, so the larger side is always
+        # the count (for replace it is the definition)
+        stats[tag] += max(i2 - i1, j2 - j1)
+
+    # Word-level diffs give finer granularity inside replace blocks.  Each
+    # pair is independent, so large batches are spread over the process pool
+    pool = _get_extract_pool() if len(word_pairs) >= _PARALLEL_WORD_PAIRS else None
+    if pool is None:
+        word_diffs = [_word_diff_pair(pair) for pair in word_pairs]
+    else:
+        word_diffs = list(pool.map(_word_diff_pair, word_pairs, chunksize=_WORD_PAIRS_PER_TASK))
+
+    pos = 0
+    for block in replace_blocks:
+        n = max(len(block["left_lines"]), len(block["right_lines"]))
+        block["word_diffs"] = word_diffs[pos:pos + n]
+        pos += n
 
     return diff_blocks, stats
 
 
+def _pack_diff_blocks(diff_blocks: list[dict]) -> dict:
+    """Convert diff blocks into the columnar form sent by /api/compare.
+
+    Each block attribute becomes one list indexed by block number, and all
+    block lines share a single ``lines_table``: block *i*'s left lines are
+    ``lines_table[left_off[i]:left_off[i] + left_end[i] - left_start[i]]``
+    (likewise for the right side; equal blocks point both sides at the same
+    lines).  ``word_diffs[i]`` is null except for replace blocks.  This
+    avoids repeating every key per block, which dominates payload size and
+    encode/parse time on large diffs.
+    """
+    packed: dict = {
+        key: [block[key] for block in diff_blocks]
+        for key in ("tag", "left_start", "left_end", "right_start", "right_end",
+                    "left_page", "right_page")
+    }
+    packed["word_diffs"] = [block.get("word_diffs") for block in diff_blocks]
+
+    left_off: list[int] = []
+    right_off: list[int] = []
+    table: list[str] = []
+    for block in diff_blocks:
+        left_off.append(len(table))
+        table.extend(block["left_lines"])
+        if block["tag"] == "equal":
+            # Both sides of an equal run are the same lines; store them once
+            right_off.append(left_off[-1])
+        else:
+            right_off.append(len(table))
+            table.extend(block["right_lines"])
+    packed["left_off"] = left_off
+    packed["right_off"] = right_off
+    packed["lines_table"] = table
+    return packed
+
+
 def compute_word_diffs(left_lines: list[str], right_lines: list[str]) -> list[dict]:
     """Produce word-level diff spans for each line pair in a replace block.
 
@@ -362,35 +979,59 @@ def compute_word_diffs(left_lines: list[str], right_lines: list[str]) -> list[di
     These spans let the frontend highlight individual changed words rather
     than colouring the entire line.
     """
-    result: list[dict] = []
+    return [_word_diff_pair(pair) for pair in _pair_lines(left_lines, right_lines)]
+
+
+def _pair_lines(left_lines: list[str], right_lines: list[str]) -> list[tuple[str, str]]:
+    """Pair two line lists positionally, padding the shorter side with ""."""
     max_len = max(len(left_lines), len(right_lines))
+    return [
+        (left_lines[i] if i < len(left_lines) else "",
+         right_lines[i] if i < len(right_lines) else "")
+        for i in range(max_len)
+    ]
+
+
+def _word_diff_pair(pair: tuple[str, str]) -> dict:
+    """Word-level spans for a single (left, right) line pair."""
+    left, right = pair
+
+    if left == right:
+        # Unchanged pair — no need for a nested matcher
+        words = left.split()
+        spans = [[" ".join(words), "equal"]] if words else []
+        return {"left_spans": spans, "right_spans": list(spans)}
 
-    for i in range(max_len):
-        left = left_lines[i] if i < len(left_lines) else ""
-        right = right_lines[i] if i < len(right_lines) else ""
+    left_words = left.split()
+    right_words = right.split()
 
-        left_words = left.split()
-        right_words = right.split()
-        sm = difflib.SequenceMatcher(None, left_words, right_words)
+    # One side empty (usually padding) — the result is a single
+    # insert or delete span, so skip the matcher entirely
+    if not left_words or not right_words:
+        return {
+            "left_spans": [[" ".join(left_words), "delete"]] if left_words else [],
+            "right_spans": [[" ".join(right_words), "insert"]] if right_words else [],
+        }
+
+    sm = difflib.SequenceMatcher(None, left_words, right_words)
 
-        left_spans: list[list] = []
-        right_spans: list[list] = []
+    left_spans: list[list] = []
+    right_spans: list[list] = []
 
-        for op, a1, a2, b1, b2 in sm.get_opcodes():
-            if op == "equal":
-                text = " ".join(left_words[a1:a2])
-                left_spans.append([text, "equal"])
-                right_spans.append([text, "equal"])
-            elif op == "delete":
-                left_spans.append([" ".join(left_words[a1:a2]), "delete"])
-            elif op == "insert":
-                right_spans.append([" ".join(right_words[b1:b2]), "insert"])
-            elif op == "replace":
-                left_spans.append([" ".join(left_words[a1:a2]), "delete"])
-                right_spans.append([" ".join(right_words[b1:b2]), "insert"])
+    for op, a1, a2, b1, b2 in sm.get_opcodes():
+        if op == "equal":
+            text = " ".join(left_words[a1:a2])
+            left_spans.append([text, "equal"])
+            right_spans.append([text, "equal"])
+        elif op == "delete":
+            left_spans.append([" ".join(left_words[a1:a2]), "delete"])
+        elif op == "insert":
+            right_spans.append([" ".join(right_words[b1:b2]), "insert"])
+        elif op == "replace":
+            left_spans.append([" ".join(left_words[a1:a2]), "delete"])
+            right_spans.append([" ".join(right_words[b1:b2]), "insert"])
 
-        result.append({"left_spans": left_spans, "right_spans": right_spans})
-    return result
+    return {"left_spans": left_spans, "right_spans": right_spans}
 
 
 # ---------------------------------------------------------------------------
@@ -416,23 +1057,130 @@ def compare_metadata(meta_a: dict, meta_b: dict) -> list[dict]:
 # Unified diff generation
 # ---------------------------------------------------------------------------
 
-def generate_unified_diff(lines_a, lines_b, name_a="original.pdf", name_b="modified.pdf"):
-    """Generate a standard unified-diff string, excluding page-marker sentinels."""
-    clean_a = [l for l in lines_a if not _is_page_marker(l)]
-    clean_b = [l for l in lines_b if not _is_page_marker(l)]
-    return "\n".join(
-        difflib.unified_diff(
-            clean_a, clean_b,
-            fromfile=name_a, tofile=name_b,
-            lineterm=""
-        )
-    )
+# Hunks stop being emitted once the unified diff reaches this many lines
+_UNIFIED_DIFF_MAX_LINES = 200_000
+
+
+def generate_unified_diff(text_a: list[str], text_b: list[str], opcodes,
+                          name_a="original.pdf", name_b="modified.pdf", context: int = 3):
+    """Generate a standard unified-diff string from already-computed opcodes.
+
+    *text_a*/*text_b* are content lines (no page sentinels) and *opcodes*
+    the (tag, i1, i2, j1, j2) tuples they were diffed into, so no second
+    matcher pass is needed.  Output matches difflib.unified_diff(lineterm="").
+    """
+    groups = list(_grouped_opcodes(opcodes, context))
+    if not groups:
+        return ""
+
+    out = [f"--- {name_a}", f"+++ {name_b}"]
+    for group in groups:
+        if len(out) >= _UNIFIED_DIFF_MAX_LINES:
+            # Keep pathological diffs from dominating the response payload
+            out.append(f"… unified diff truncated after {_UNIFIED_DIFF_MAX_LINES} lines")
+            break
+        first, last = group[0], group[-1]
+        out.append(f"@@ -{_unified_range(first[1], last[2])} "
+                   f"+{_unified_range(first[3], last[4])} @@")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                out.extend(" " + line for line in text_a[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                out.extend("-" + line for line in text_a[i1:i2])
+            if tag in ("replace", "insert"):
+                out.extend("+" + line for line in text_b[j1:j2])
+    return "\n".join(out)
+
+
+def _grouped_opcodes(opcodes, n: int = 3):
+    """Yield hunks of opcodes with up to *n* lines of context.
+
+    Same grouping as difflib.SequenceMatcher.get_grouped_opcodes(), but over
+    an arbitrary opcode list.
+    """
+    codes = list(opcodes)
+    if not codes or (len(codes) == 1 and codes[0][0] == "equal"):
+        return
+    if codes[0][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == "equal":
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        # Split long unchanged runs, keeping n lines of context either side
+        if tag == "equal" and i2 - i1 > 2 * n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _unified_range(start: int, stop: int) -> str:
+    """Format a hunk range as 'start,length' the way unified diffs expect."""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
 
 
 # ---------------------------------------------------------------------------
 # Deterministic report generation
 # ---------------------------------------------------------------------------
 
+# Static report text, built once at import rather than per report.
+# Severity thresholds: >30% = High, >10% = Medium, else Low
+_SEVERITY_HIGH = ("**High** — The documents differ substantially. This likely represents a major "
+                  "revision affecting the overall meaning and structure of the document.")
+_SEVERITY_MEDIUM = ("**Medium** — Notable differences exist. Specific sections have been altered "
+                    "which may affect interpretation of those sections.")
+_SEVERITY_LOW = ("**Low** — Minor differences detected. The documents are largely the same "
+                 "with small edits.")
+
+_ADDITIONS_INTRO = ("New content was introduced in Document B that does not appear in Document A. "
+                    "This may represent additional clauses, information, or context that changes "
+                    "the scope or meaning of the document.\n\n")
+_DELETIONS_INTRO = ("Content present in Document A has been removed in Document B. "
+                    "Removed text may eliminate obligations, rights, definitions, or "
+                    "qualifications that previously applied.\n\n")
+_MODIFICATIONS_INTRO = ("Existing text was altered between the two versions. Modifications can "
+                        "change meaning, adjust figures, update references, or shift the tone "
+                        "of the document.\n\n")
+
+_CONSEQUENCE_DELETIONS = ("- **Removed content** may eliminate previously established terms, "
+                          "conditions, or information. Reviewers should verify that no critical "
+                          "clauses were unintentionally dropped.\n")
+_CONSEQUENCE_ADDITIONS = ("- **Added content** introduces new information or requirements. "
+                          "Stakeholders should review these additions for compliance and "
+                          "alignment with expectations.\n")
+_CONSEQUENCE_MODIFICATIONS = ("- **Modified sections** could alter the interpretation of existing "
+                              "provisions. A careful line-by-line review of changed sections is "
+                              "recommended to assess whether the intent has shifted.\n")
+_CONSEQUENCE_HIGH_VOLUME = ("- Given the **high volume of changes**, a full re-review of "
+                            "Document B is advisable rather than relying on a delta review alone.\n")
+
+
+def _preview(lines: list[str], count: int, limit: int) -> str:
+    """Join the first *count* lines, truncated to *limit* chars plus "…".
+
+    Each line is clipped to limit + 1 chars before joining, so a single
+    enormous line is never copied in full just to be cut back down.
+    """
+    preview = " ".join(line[:limit + 1] for line in lines[:count])
+    if len(preview) > limit:
+        preview = preview[:limit] + "…"
+    return preview
+
+
 def generate_report(diff_blocks, stats, name_a, name_b):
     """Build a human-readable Markdown report from diff results.
 
@@ -447,52 +1195,60 @@ def generate_report(diff_blocks, stats, name_a, name_b):
     changed = stats["insert"] + stats["delete"] + stats["replace"]
     pct = (changed / total_lines * 100) if total_lines else 0
 
-    lines = [
-        f"# PDF Comparison Report",
-        f"",
-        f"**Date:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
-        f"",
-        f"**Document A:** {name_a}",
-        f"**Document B:** {name_b}",
-        f"",
-        f"---",
-        f"",
-        f"## Summary Statistics",
-        f"",
-        f"| Metric | Count |",
-        f"|--------|-------|",
-        f"| Unchanged lines | {stats['equal']} |",
-        f"| Inserted lines | {stats['insert']} |",
-        f"| Deleted lines | {stats['delete']} |",
-        f"| Modified lines | {stats['replace']} |",
-        f"| **Total changed** | **{changed}** |",
-        f"| Change percentage | {pct:.1f}% |",
-        f"",
-        f"---",
-        f"",
-        f"## Impact Analysis",
-        f"",
-    ]
+    buf = io.StringIO()
+    w = buf.write
+    w(f"""# PDF Comparison Report
+
+**Date:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+
+**Document A:** {name_a}
+**Document B:** {name_b}
+
+---
+
+## Summary Statistics
+
+| Metric | Count |
+|--------|-------|
+| Unchanged lines | {stats['equal']} |
+| Inserted lines | {stats['insert']} |
+| Deleted lines | {stats['delete']} |
+| Modified lines | {stats['replace']} |
+| **Total changed** | **{changed}** |
+| Change percentage | {pct:.1f}% |
+
+---
+
+## Impact Analysis
+
+""")
 
     if changed == 0:
-        lines.append("The two documents are **identical** in textual content. No differences found.")
-        return "\n".join(lines)
+        w("The two documents are **identical** in textual content. No differences found.")
+        return buf.getvalue()
 
-    # Severity thresholds: >30% = High, >10% = Medium, else Low
     if pct > 30:
-        severity = "**High** — The documents differ substantially. This likely represents a major revision affecting the overall meaning and structure of the document."
+        severity = _SEVERITY_HIGH
     elif pct > 10:
-        severity = "**Medium** — Notable differences exist. Specific sections have been altered which may affect interpretation of those sections."
+        severity = _SEVERITY_MEDIUM
     else:
-        severity = "**Low** — Minor differences detected. The documents are largely the same with small edits."
-
-    lines.append(f"**Overall severity:** {severity}")
-    lines.append("")
-
-    # Categorise diff blocks by change type
-    additions = [b for b in diff_blocks if b["tag"] == "insert"]
-    deletions = [b for b in diff_blocks if b["tag"] == "delete"]
-    modifications = [b for b in diff_blocks if b["tag"] == "replace"]
+        severity = _SEVERITY_LOW
+
+    w("**Overall severity:** ")
+    w(severity)
+    w("\n\n")
+
+    # Categorise diff blocks by change type in a single pass; equal blocks
+    # have no bucket and are skipped
+    additions: list[dict] = []
+    deletions: list[dict] = []
+    modifications: list[dict] = []
+    buckets = {"insert": additions.append, "delete": deletions.append,
+               "replace": modifications.append}
+    for b in diff_blocks:
+        append = buckets.get(b["tag"])
+        if append is not None:
+            append(b)
 
     def _page_label(block, side="right"):
         """Format a ' (page N)' suffix if the block has page info."""
@@ -501,86 +1257,49 @@ def generate_report(diff_blocks, stats, name_a, name_b):
 
     # --- New content ---
     if additions:
-        lines.append(f"### New Content ({len(additions)} section(s) added)")
-        lines.append("")
-        lines.append("New content was introduced in Document B that does not appear in Document A. "
-                      "This may represent additional clauses, information, or context that changes "
-                      "the scope or meaning of the document.")
-        lines.append("")
+        w(f"### New Content ({len(additions)} section(s) added)\n\n")
+        w(_ADDITIONS_INTRO)
         for i, b in enumerate(additions, 1):
-            preview = " ".join(b["right_lines"][:3])
-            if len(preview) > 200:
-                preview = preview[:200] + "…"
-            lines.append(f"{i}. Near line {b['right_start'] + 1}{_page_label(b, 'right')}: *\"{preview}\"*")
-        lines.append("")
+            preview = _preview(b["right_lines"], 3, 200)
+            w("".join((str(i), ". Near line ", str(b["right_start"] + 1),
+                       _page_label(b, "right"), ': *"', preview, '"*\n')))
+        w("\n")
 
     # --- Removed content ---
     if deletions:
-        lines.append(f"### Removed Content ({len(deletions)} section(s) deleted)")
-        lines.append("")
-        lines.append("Content present in Document A has been removed in Document B. "
-                      "Removed text may eliminate obligations, rights, definitions, or "
-                      "qualifications that previously applied.")
-        lines.append("")
+        w(f"### Removed Content ({len(deletions)} section(s) deleted)\n\n")
+        w(_DELETIONS_INTRO)
         for i, b in enumerate(deletions, 1):
-            preview = " ".join(b["left_lines"][:3])
-            if len(preview) > 200:
-                preview = preview[:200] + "…"
-            lines.append(f"{i}. Near line {b['left_start'] + 1}{_page_label(b, 'left')}: *\"{preview}\"*")
-        lines.append("")
+            preview = _preview(b["left_lines"], 3, 200)
+            w("".join((str(i), ". Near line ", str(b["left_start"] + 1),
+                       _page_label(b, "left"), ': *"', preview, '"*\n')))
+        w("\n")
 
     # --- Modified content ---
     if modifications:
-        lines.append(f"### Modified Content ({len(modifications)} section(s) changed)")
-        lines.append("")
-        lines.append("Existing text was altered between the two versions. Modifications can "
-                      "change meaning, adjust figures, update references, or shift the tone "
-                      "of the document.")
-        lines.append("")
+        w(f"### Modified Content ({len(modifications)} section(s) changed)\n\n")
+        w(_MODIFICATIONS_INTRO)
         for i, b in enumerate(modifications, 1):
-            old_preview = " ".join(b["left_lines"][:2])
-            new_preview = " ".join(b["right_lines"][:2])
-            if len(old_preview) > 150:
-                old_preview = old_preview[:150] + "…"
-            if len(new_preview) > 150:
-                new_preview = new_preview[:150] + "…"
-            lines.append(f"{i}. Line {b['left_start'] + 1}{_page_label(b, 'left')}:")
-            lines.append(f"   - **Was:** *\"{old_preview}\"*")
-            lines.append(f"   - **Now:** *\"{new_preview}\"*")
-        lines.append("")
+            old_preview = _preview(b["left_lines"], 2, 150)
+            new_preview = _preview(b["right_lines"], 2, 150)
+            w("".join((str(i), ". Line ", str(b["left_start"] + 1), _page_label(b, "left"), ":\n",
+                       '   - **Was:** *"', old_preview, '"*\n',
+                       '   - **Now:** *"', new_preview, '"*\n')))
+        w("\n")
 
     # --- Consequences ---
-    lines.extend([
-        "---",
-        "",
-        "## Consequences",
-        "",
-    ])
-
-    consequences: list[str] = []
+    w("---\n\n## Consequences\n\n")
     if deletions:
-        consequences.append("- **Removed content** may eliminate previously established terms, "
-                            "conditions, or information. Reviewers should verify that no critical "
-                            "clauses were unintentionally dropped.")
+        w(_CONSEQUENCE_DELETIONS)
     if additions:
-        consequences.append("- **Added content** introduces new information or requirements. "
-                            "Stakeholders should review these additions for compliance and "
-                            "alignment with expectations.")
+        w(_CONSEQUENCE_ADDITIONS)
     if modifications:
-        consequences.append("- **Modified sections** could alter the interpretation of existing "
-                            "provisions. A careful line-by-line review of changed sections is "
-                            "recommended to assess whether the intent has shifted.")
-
+        w(_CONSEQUENCE_MODIFICATIONS)
     if pct > 30:
-        consequences.append("- Given the **high volume of changes**, a full re-review of "
-                            "Document B is advisable rather than relying on a delta review alone.")
-
-    lines.extend(consequences)
-    lines.append("")
-    lines.append("---")
-    lines.append("*Report generated by PDFCompare.*")
+        w(_CONSEQUENCE_HIGH_VOLUME)
 
-    return "\n".join(lines)
+    w("\n---\n*Report generated by PDFCompare.*")
+    return buf.getvalue()
 
 
 # ---------------------------------------------------------------------------
@@ -598,6 +1317,170 @@ def _safe_filename(file_storage) -> str:
     return name
 
 
+def _read_head(stream, n: int) -> bytes:
+    """Return the first *n* bytes of a seekable stream, leaving it rewound."""
+    stream.seek(0)
+    head = stream.read(n)
+    stream.seek(0)
+    return head
+
+
+def _stream_size(stream) -> int:
+    """Return the total size of a seekable stream, leaving it rewound."""
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    return size
+
+
+# ---------------------------------------------------------------------------
+# Comparison pipeline and background jobs
+# ---------------------------------------------------------------------------
+
+# Held while a prewarm thread runs, so a burst of comparisons starts one
+_prewarm_lock = threading.Lock()
+
+
+def _prewarm_default_llm() -> None:
+    """Connect to the server's default LLM provider in the background.
+
+    A finished comparison is usually followed by an LLM report request, so
+    the TCP/TLS handshake is done while the user reads the diff.  Skipped
+    while an earlier prewarm is still running.
+    """
+    if not config.LLM_PROVIDER or not _prewarm_lock.acquire(blocking=False):
+        return
+    llm_config = {"endpoint": config.LLM_ENDPOINT} if config.LLM_ENDPOINT else {}
+    try:
+        threading.Thread(target=_prewarm_llm_once, args=(config.LLM_PROVIDER, llm_config),
+                         daemon=True).start()
+    except RuntimeError:
+        _prewarm_lock.release()
+
+
+def _prewarm_llm_once(provider: str, llm_config: dict) -> None:
+    """Prewarm thread body: prewarm_llm(), then let the next prewarm start."""
+    try:
+        prewarm_llm(provider, llm_config)
+    finally:
+        _prewarm_lock.release()
+
+
+def _broken_pool_response(pool) -> tuple[dict, int]:
+    """Replace a process pool that lost a worker and answer 503."""
+    logger.exception("Extraction worker process died")
+    _discard_extract_pool(pool)
+    return {"error": "PDF processing was interrupted. Please try again."}, 503
+
+
+def _run_compare(stream_a, stream_b, name_a, name_b, ignore_options) -> tuple[dict, int]:
+    """Extract, diff and report on two validated uploads.
+
+    Returns (payload, status) for the /api/compare response, so the same
+    pipeline serves synchronous requests and background jobs.
+    """
+    # The pool in use for this comparison, discarded if a worker dies
+    pool = _get_extract_pool()
+    try:
+        # Schedule both documents before consuming either so their pages
+        # are extracted concurrently
+        key_a = _pdf_digest(stream_a)
+        key_b = _pdf_digest(stream_b)
+        lines_a, meta_a = _start_cached_extraction(stream_a, key_a)
+        if key_b != key_a:
+            lines_b, meta_b = _start_cached_extraction(stream_b, key_b)
+        # Stream extraction straight through the ignore rules into the
+        # diff's content/page lists
+        text_a, page_of_a = _split_page_markers(filter_lines(lines_a, ignore_options))
+        if key_b == key_a:
+            # The same file uploaded twice: extract and filter it once; the
+            # diff then short-circuits on the identical line lists
+            text_b, page_of_b, meta_b = text_a, page_of_a, meta_a
+        else:
+            text_b, page_of_b = _split_page_markers(filter_lines(lines_b, ignore_options))
+    except (ValueError, IOError, OSError, PSException, PDFSyntaxError, PdfminerException):
+        logger.exception("PDF text extraction failed")
+        return {"error": "Failed to extract text from one or both PDFs."}, 422
+    except BrokenProcessPool:
+        return _broken_pool_response(pool)
+
+    # Bound the diff's input; beyond this the line diff and response size
+    # grow faster than is reasonable for a single request
+    if len(text_a) + len(text_b) > config.MAX_DIFF_LINES:
+        return {"error": f"Documents exceed {config.MAX_DIFF_LINES} lines combined. "
+                         "Please use smaller files."}, 413
+
+    try:
+        diff_blocks, stats = compute_content_diff(text_a, page_of_a, text_b, page_of_b)
+    except BrokenProcessPool:
+        return _broken_pool_response(pool)
+    opcodes = [(b["tag"], b["left_start"], b["left_end"], b["right_start"], b["right_end"])
+               for b in diff_blocks]
+    unified = generate_unified_diff(text_a, text_b, opcodes, name_a, name_b)
+    report = generate_report(diff_blocks, stats, name_a, name_b)
+    metadata_diff = compare_metadata(meta_a, meta_b)
+    _prewarm_default_llm()
+
+    return {
+        "diff_blocks": _pack_diff_blocks(diff_blocks),
+        "stats": stats,
+        "unified_diff": unified,
+        "report": report,
+        "name_a": name_a,
+        "name_b": name_b,
+        "metadata_a": meta_a,
+        "metadata_b": meta_b,
+        "metadata_diff": metadata_diff,
+    }, 200
+
+
+# Finished jobs that were never collected are dropped after this long
+_COMPARE_JOB_TTL = 600
+
+_compare_executor = None
+# job id -> (submission time, future of (payload, status))
+_compare_jobs: dict[str, tuple[float, Future]] = {}
+_compare_jobs_lock = threading.Lock()
+
+
+def _spool_copy(stream):
+    """Copy a seekable upload stream into a temp file the job can own."""
+    copy = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    stream.seek(0)
+    shutil.copyfileobj(stream, copy)
+    copy.seek(0)
+    return copy
+
+
+def _compare_job(stream_a, stream_b, name_a, name_b, ignore_options) -> tuple[dict, int]:
+    """Background job body: _run_compare() on spooled copies, then clean up."""
+    try:
+        return _run_compare(stream_a, stream_b, name_a, name_b, ignore_options)
+    finally:
+        stream_a.close()
+        stream_b.close()
+
+
+def _submit_compare_job(stream_a, stream_b, name_a, name_b, ignore_options) -> str:
+    """Queue a comparison on the background executor and return its job id.
+
+    Jobs live in this process's memory, so polling must reach the same
+    process: run a single worker process (with threads) when COMPARE_ASYNC
+    is enabled.
+    """
+    global _compare_executor
+    now = time.time()
+    with _compare_jobs_lock:
+        if _compare_executor is None:
+            _compare_executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1)
+        for stale_id, (submitted, future) in list(_compare_jobs.items()):
+            if future.done() and now - submitted > _COMPARE_JOB_TTL:
+                del _compare_jobs[stale_id]
+        job_id = uuid.uuid4().hex
+        _compare_jobs[job_id] = (now, _compare_executor.submit(
+            _compare_job, stream_a, stream_b, name_a, name_b, ignore_options))
+    return job_id
+
+
 # ===========================================================================
 # API Routes
 # ===========================================================================
@@ -615,7 +1498,7 @@ def get_config():
     Returns the configured LLM provider, model, and endpoint (but never
     the API key itself — only a boolean indicating whether one is set).
     """
-    return jsonify({
+    return _json_response({
         "llm_provider": config.LLM_PROVIDER,
         "llm_model": config.LLM_MODEL,
         "llm_endpoint": config.LLM_ENDPOINT,
@@ -637,14 +1520,15 @@ def compare():
       ignore_pattern         – regex; matching lines are dropped
 
     Returns JSON with diff_blocks, stats, unified_diff, report,
-    metadata_a/b, and metadata_diff.
+    metadata_a/b, and metadata_diff — or, when COMPARE_ASYNC is enabled,
+    202 with a job_id to poll at /api/compare/<job_id>.
     """
     csrf_err = _check_origin()
     if csrf_err:
         return csrf_err
 
     if "pdf_a" not in request.files or "pdf_b" not in request.files:
-        return jsonify({"error": "Two PDF files are required (pdf_a and pdf_b)."}), 400
+        return _json_response({"error": "Two PDF files are required (pdf_a and pdf_b)."}, 400)
 
     pdf_a = request.files["pdf_a"]
     pdf_b = request.files["pdf_b"]
@@ -652,19 +1536,19 @@ def compare():
     name_a = _safe_filename(pdf_a)
     name_b = _safe_filename(pdf_b)
 
-    if not name_a.lower().endswith(".pdf") or not name_b.lower().endswith(".pdf"):
-        return jsonify({"error": "Both files must be PDFs."}), 400
-
-    bytes_a = pdf_a.read()
-    bytes_b = pdf_b.read()
+    # Hand pdfplumber the uploads' spooled streams directly instead of
+    # copying each file into a bytes object
+    stream_a = pdf_a.stream
+    stream_b = pdf_b.stream
 
-    # Validate PDF magic bytes before handing to pdfplumber
-    if not bytes_a[:5] == b'%PDF-' or not bytes_b[:5] == b'%PDF-':
-        return jsonify({"error": "One or both files are not valid PDF documents."}), 400
+    # Uploads are identified by their magic bytes, not their names, and
+    # anything else is refused before any parser sees it
+    if not _read_head(stream_a, 5) == b'%PDF-' or not _read_head(stream_b, 5) == b'%PDF-':
+        return _json_response({"error": "One or both files are not valid PDF documents."}, 415)
 
     max_file_bytes = config.MAX_UPLOAD_MB * 1024 * 1024
-    if len(bytes_a) > max_file_bytes or len(bytes_b) > max_file_bytes:
-        return jsonify({"error": f"Each file must be under {config.MAX_UPLOAD_MB} MB."}), 400
+    if _stream_size(stream_a) > max_file_bytes or _stream_size(stream_b) > max_file_bytes:
+        return _json_response({"error": f"Each file must be under {config.MAX_UPLOAD_MB} MB."}, 400)
 
     # Parse ignore options from form data
     ignore_options = {
@@ -673,39 +1557,47 @@ def compare():
         "ignore_headers_footers": request.form.get("ignore_headers_footers") == "true",
         "ignore_pattern": request.form.get("ignore_pattern", ""),
     }
-
+    if ignore_options["ignore_pattern"]:
+        pattern_error = _ignore_pattern_error(ignore_options["ignore_pattern"])
+        if pattern_error:
+            return _json_response({"error": pattern_error}, 400)
+
+    if config.COMPARE_ASYNC:
+        # Copy the uploads out of the request, which is gone by the time
+        # the job runs, and hand back a job id for the client to poll
+        job_id = _submit_compare_job(_spool_copy(stream_a), _spool_copy(stream_b),
+                                     name_a, name_b, ignore_options)
+        return _json_response({"job_id": job_id}, 202)
+
+    payload, status = _run_compare(stream_a, stream_b, name_a, name_b, ignore_options)
+    return _json_response(payload, status)
+
+
+@app.route("/api/compare/<job_id>")
+@rate_limit(300, 60)
+def compare_job(job_id):
+    """Poll a comparison submitted while COMPARE_ASYNC is enabled.
+
+    Returns 202 while the job is running, then the same payload and status
+    a synchronous /api/compare would have returned (once; the job is then
+    forgotten).  Unknown or already-collected ids return 404.
+    """
+    with _compare_jobs_lock:
+        job = _compare_jobs.get(job_id)
+        if job is not None and job[1].done():
+            del _compare_jobs[job_id]
+    if job is None:
+        return _json_response({"error": "Unknown or expired comparison job."}, 404)
+
+    future = job[1]
+    if not future.done():
+        return _json_response({"status": "pending"}, 202)
     try:
-        # Single-pass extraction: text + metadata from one pdfplumber.open()
-        lines_a, meta_a = extract_text_and_metadata(bytes_a)
-        lines_b, meta_b = extract_text_and_metadata(bytes_b)
-    except (ValueError, IOError, OSError):
-        logger.exception("PDF text extraction failed")
-        return jsonify({"error": "Failed to extract text from one or both PDFs."}), 422
-
-    MAX_LINES = 50_000
-    if len(lines_a) > MAX_LINES or len(lines_b) > MAX_LINES:
-        return jsonify({"error": f"Documents exceed {MAX_LINES} lines. Please use smaller files."}), 400
-
-    # Apply user-selected ignore rules before diffing
-    filtered_a = apply_ignore_rules(lines_a, ignore_options)
-    filtered_b = apply_ignore_rules(lines_b, ignore_options)
-
-    diff_blocks, stats = compute_diff(filtered_a, filtered_b)
-    unified = generate_unified_diff(filtered_a, filtered_b, name_a, name_b)
-    report = generate_report(diff_blocks, stats, name_a, name_b)
-    metadata_diff = compare_metadata(meta_a, meta_b)
-
-    return jsonify({
-        "diff_blocks": diff_blocks,
-        "stats": stats,
-        "unified_diff": unified,
-        "report": report,
-        "name_a": name_a,
-        "name_b": name_b,
-        "metadata_a": meta_a,
-        "metadata_b": meta_b,
-        "metadata_diff": metadata_diff,
-    })
+        payload, status = future.result()
+    except Exception:
+        logger.exception("Background comparison failed")
+        return _json_response({"error": "Comparison failed."}, 500)
+    return _json_response(payload, status)
 
 
 @app.route("/api/llm-report", methods=["POST"])
@@ -724,16 +1616,16 @@ def llm_report():
 
     data = request.get_json(silent=True)
     if not data:
-        return jsonify({"error": "JSON body required."}), 400
+        return _json_response({"error": "JSON body required."}, 400)
 
     required = ["provider", "unified_diff", "stats", "name_a", "name_b"]
     missing = [k for k in required if k not in data]
     if missing:
-        return jsonify({"error": f"Missing fields: {missing}"}), 400
+        return _json_response({"error": f"Missing fields: {missing}"}, 400)
 
     provider = data["provider"] or config.LLM_PROVIDER
     if not provider:
-        return jsonify({"error": "No LLM provider specified."}), 400
+        return _json_response({"error": "No LLM provider specified."}, 400)
 
     # Merge: .env defaults ← request overrides
     # Only apply .env model/endpoint if the provider matches .env provider,
@@ -760,12 +1652,12 @@ def llm_report():
             expert_field=data.get("expert_field", ""),
         )
     except ValueError as e:
-        return jsonify({"error": str(e)}), 400
-    except (urllib.error.URLError, IOError, OSError, KeyError, json.JSONDecodeError):
+        return _json_response({"error": str(e)}, 400)
+    except (http.client.HTTPException, OSError):
         logger.exception("LLM report generation failed")
-        return jsonify({"error": "LLM request failed. Check provider settings and try again."}), 502
+        return _json_response({"error": "LLM request failed. Check provider settings and try again."}, 502)
 
-    return jsonify({"report": report})
+    return _json_response({"report": report})
 
 
 @app.route("/<path:path>")
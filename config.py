@@ -18,12 +18,33 @@ load_dotenv()
 PORT = int(os.getenv("FLASK_PORT", "5000"))            # HTTP listen port
 DEBUG = os.getenv("FLASK_DEBUG", "false").lower() in ("1", "true", "yes")
 MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))   # Per-file upload cap
+MAX_DIFF_LINES = int(os.getenv("MAX_DIFF_LINES", "100000"))  # Combined extracted-line cap
+# Processes used for PDF text extraction (0 = one per CPU, 1 = no pool)
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", "0")) or (os.cpu_count() or 1)
+# Run comparisons as background jobs the frontend polls (single-process only)
+COMPARE_ASYNC = os.getenv("COMPARE_ASYNC", "false").lower() in ("1", "true", "yes")
+# Extracted documents kept in memory, keyed by content hash (0 = no cache)
+EXTRACT_CACHE_SIZE = int(os.getenv("EXTRACT_CACHE_SIZE", "16"))
+# Text extraction engine: "pdfplumber" or "pdfium" (faster; needs pypdfium2)
+PDF_ENGINE = os.getenv("PDF_ENGINE", "pdfplumber").lower()
+# Line diff algorithm: "myers" (minimal, O(ND)) or "difflib" (SequenceMatcher)
+DIFF_ALGORITHM = os.getenv("DIFF_ALGORITHM", "myers").lower()
 
 # ── LLM defaults ────────────────────────────────────────────────────────────
 # These act as server-side defaults.  The frontend UI fields override them
 # when the user fills them in.
 
-LLM_PROVIDER = os.getenv("LLM_PROVIDER", "")    # "ollama", "openai", or "gemini"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "")    # e.g. "ollama", "openai", "anthropic"
 LLM_MODEL = os.getenv("LLM_MODEL", "")          # e.g. "llama3", "gpt-4o"
 LLM_API_KEY = os.getenv("LLM_API_KEY", "")       # Required for openai / gemini
 LLM_ENDPOINT = os.getenv("LLM_ENDPOINT", "")     # Custom endpoint URL override
+# Unified diff characters sent to the LLM; the middle of longer diffs is omitted
+MAX_DIFF_CHARS = int(os.getenv("MAX_DIFF_CHARS", "60000"))
+# Optional token budget for the diff, counted with tiktoken (0 = characters only)
+MAX_DIFF_TOKENS = int(os.getenv("MAX_DIFF_TOKENS", "0"))
+# Seconds an identical LLM report request is answered from memory (0 = off)
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "0"))
+# Directory that also persists cached reports across restarts ("" = memory only)
+LLM_CACHE_DIR = os.path.expanduser(os.getenv("LLM_CACHE_DIR", ""))
+# Gzip large request bodies sent to cloud LLM providers (needs provider support)
+LLM_GZIP_REQUESTS = os.getenv("LLM_GZIP_REQUESTS", "false").lower() in ("1", "true", "yes")
@@ -1,48 +1,176 @@
 """
 LLM provider abstraction for PDF comparison report generation.
 
-Supports four providers — Ollama (local), LM Studio (local), OpenAI, and Google Gemini — via
-stdlib ``urllib`` so no additional HTTP library is needed.  Each provider
-function builds the appropriate JSON payload, POSTs it, and returns the
-model's Markdown response.
+Supports Ollama and LM Studio (local), OpenAI, Google Gemini, Anthropic,
+and the OpenAI-compatible Mistral, Groq, DeepSeek, Kimi and Perplexity APIs
+via stdlib ``http.client`` keep-alive connections so no additional HTTP
+library is needed.  Each provider function builds the appropriate JSON payload,
+POSTs it, and returns the model's Markdown response.
 
 Security: all user-supplied endpoint URLs are validated against a blocklist
 of cloud-metadata and internal addresses to prevent SSRF.
 """
 
+import asyncio
+import gzip
+import hashlib
+import http.client
 import ipaddress
 import json
+import os
+import random
+import re
 import socket
-import urllib.request
-import urllib.error
+import ssl
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from urllib.parse import urlparse
 
+import orjson
+
+try:
+    import tiktoken  # optional: token-accurate diff budget (MAX_DIFF_TOKENS)
+except ImportError:
+    tiktoken = None
+
+from config import LLM_CACHE_DIR, LLM_CACHE_TTL, LLM_GZIP_REQUESTS, MAX_DIFF_CHARS, MAX_DIFF_TOKENS
+
 
 # ---------------------------------------------------------------------------
-# No-redirect HTTP opener to prevent SSRF via redirect
+# Keep-alive HTTP transport (redirects are never followed, to prevent SSRF)
 # ---------------------------------------------------------------------------
 
-class _NoRedirectHandler(urllib.request.HTTPErrorProcessor):
-    """Treat 3xx redirects as errors to prevent SSRF via redirect."""
-    def http_response(self, request, response):
-        if 300 <= response.code < 400:
-            raise urllib.error.HTTPError(
-                request.full_url, response.code,
-                "Redirects are not allowed for LLM endpoints",
-                response.headers, response,
-            )
-        return super().http_response(request, response)
-    https_response = http_response
+# Sent with every LLM request
+_USER_AGENT = "PDFCompare"
+
+# Endpoint URLs repeat on every call to the same provider; ParseResult is an
+# immutable tuple, so parses are shared between validation and the pool
+_parse_url = lru_cache(maxsize=64)(urlparse)
+
+# Idle connections kept per (scheme, host, port)
+_POOL_MAX_IDLE = 16
+# Seconds an idle connection is kept before it is closed instead of reused
+_POOL_IDLE_EXPIRY = 60
+# Seconds allowed for the TCP connect and TLS handshake of a new connection
+_CONNECT_TIMEOUT = 10
+_pool: dict = {}
+_pool_lock = threading.Lock()
+
+# One TLS context for every HTTPS connection, so CA certificates are loaded once
+_SSL_CONTEXT = ssl.create_default_context()
+
+# Errors meaning a reused keep-alive connection was closed by the server
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError)
 
-_opener = urllib.request.build_opener(_NoRedirectHandler)
+# Rate-limit and transient server statuses retried with exponential backoff
+# (1 s, then 2 s, plus up to 1 s of jitter), sending a request at most
+# _RETRY_ATTEMPTS times in all; Retry-After is honoured up to
+# _RETRY_MAX_DELAY seconds.  No retry starts once _RETRY_DEADLINE seconds
+# have passed since the first send, so a report request cannot hold a
+# worker for minutes before the model even runs.
+_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+_RETRY_ATTEMPTS = 3
+_RETRY_MAX_DELAY = 30.0
+_RETRY_DEADLINE = 30.0
+
+
+def _pool_key(parsed) -> tuple:
+    """Pool key for a parsed URL: (scheme, host, port)."""
+    return parsed.scheme, parsed.hostname, parsed.port or (443 if parsed.scheme == "https" else 80)
+
+
+def _checkout(key: tuple, addresses: list | None = None):
+    """Return an idle pooled connection for *key*, or a new unconnected one.
+
+    A new connection dials *addresses*, the ``getaddrinfo`` results
+    _validate_endpoint() vetted for this request.
+    """
+    expired = []
+    conn = None
+    cutoff = time.monotonic() - _POOL_IDLE_EXPIRY
+    with _pool_lock:
+        idle = _pool.get(key)
+        while idle:
+            candidate, idle_since = idle.pop()
+            if idle_since >= cutoff:
+                conn = candidate
+                break
+            expired.append(candidate)
+    for stale in expired:
+        stale.close()
+    if conn is None:
+        scheme, host, port = key
+        if scheme == "https":
+            conn = http.client.HTTPSConnection(host, port, timeout=_CONNECT_TIMEOUT, context=_SSL_CONTEXT)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=_CONNECT_TIMEOUT)
+        # Dial the addresses _validate_endpoint() vetted rather than letting
+        # http.client resolve the name again, which could return a different
+        # (unchecked) address once the DNS cache entry expires; TLS SNI and
+        # the Host header still carry the hostname
+        conn._create_connection = partial(_connect_resolved, addresses)
+        return conn, False
+    return conn, True
+
+
+def _has_idle(key: tuple) -> bool:
+    """True if the pool holds an unexpired idle connection for *key*."""
+    with _pool_lock:
+        idle = _pool.get(key)
+        # Connections are checked in at the end, so the last is the newest
+        return bool(idle) and idle[-1][1] >= time.monotonic() - _POOL_IDLE_EXPIRY
+
+
+def _connect_resolved(addresses: list | None, address: tuple, timeout,
+                      source_address=None) -> socket.socket:
+    """``socket.create_connection()`` over the vetted ``getaddrinfo`` results.
+
+    Without *addresses* (a caller that skipped _validate_endpoint()) the
+    cached ``_resolve()`` results are used.
+    """
+    host, port = address
+    if addresses is None:
+        addresses = _resolve(host, port)
+    error = None
+    for family, socktype, proto, _, sockaddr in addresses:
+        sock = socket.socket(family, socktype, proto)
+        try:
+            sock.settimeout(timeout)
+            if source_address:
+                sock.bind(source_address)
+            sock.connect(sockaddr)
+            return sock
+        except OSError as e:
+            sock.close()
+            error = e
+    raise error or OSError(f"Cannot resolve hostname: {host}")
+
+
+def _checkin(key: tuple, conn) -> None:
+    """Return *conn* to the pool, closing it if the pool is full."""
+    with _pool_lock:
+        idle = _pool.setdefault(key, [])
+        if len(idle) < _POOL_MAX_IDLE:
+            idle.append((conn, time.monotonic()))
+            return
+    conn.close()
 
 
 # ---------------------------------------------------------------------------
 # System prompt sent to every LLM provider
 # ---------------------------------------------------------------------------
 
-_SYSTEM_PROMPT_TEMPLATE = """\
-You are a senior expert in {field}. You will receive a unified diff of two PDF documents \
+# The instructions are byte-identical on every call and the per-document
+# expert field is appended after them, so providers that cache prompts by
+# longest common prefix (Anthropic, OpenAI) can reuse the whole block.
+_SYSTEM_PROMPT = """\
+You are a senior domain expert; your field of expertise is stated at the end of these \
+instructions. You will receive a unified diff of two PDF documents \
 along with summary statistics. Focus exclusively on substantive content changes — additions, \
 deletions, and modifications of meaning, provisions, data, or requirements. \
 Ignore formatting, layout, whitespace, numbering, punctuation, and stylistic changes entirely.
@@ -53,11 +181,8 @@ State what changed, note it occurs throughout the document (e.g. "across all pag
 "approximately N occurrences"), and move on. Never list individual line numbers for repetitive \
 changes — a representative example with one or two line references is sufficient.
 
-Produce a thorough, in-depth Markdown report. Begin with a header line:
-
-**Expert analysis by: {field} specialist** ({detection_note})
-
-Then structure the report as follows:
+Produce a thorough, in-depth Markdown report. Begin with the header line given at the end \
+of these instructions, then structure the report as follows:
 
 1. **Subject Matter & Context**: Identify what these documents are about and provide \
    background context that a reader needs to understand the significance of the changes.
@@ -80,7 +205,7 @@ Then structure the report as follows:
    Identify any cascading effects where one change amplifies or undermines another. \
    Flag any contradictions between changes.
 5. **Severity Assessment**: Rate overall severity (Low / Medium / High / Critical) \
-   based on how the changes affect obligations, rights, risks, or outcomes in {field}. \
+   based on how the changes affect obligations, rights, risks, or outcomes in your field. \
    Justify the rating with specific references to the changes.
 6. **Regulatory & Legal Implications**: Highlight any changes that could alter legal, \
    financial, regulatory, or contractual obligations specific to this domain. \
@@ -94,7 +219,7 @@ Then structure the report as follows:
 Do NOT report on formatting, whitespace, reordering, renumbering, or cosmetic edits. \
 Only analyse changes that affect the substance or meaning of the document. \
 Be precise, cite page/line numbers when possible, and use professional language. \
-Provide the depth of analysis expected from a seasoned professional in {field}.
+Provide the depth of analysis expected from a seasoned professional in your field.
 
 CRITICAL FORMATTING RULES — you MUST follow these exactly:
 - Use EXACTLY the 7 numbered section headings listed above (Subject Matter & Context, \
@@ -103,36 +228,63 @@ CRITICAL FORMATTING RULES — you MUST follow these exactly:
 - Start the report with the "Expert analysis by" header line as specified.
 - NEVER list more than 3 line/page references for any single change. For repetitive \
   changes, write "e.g. lines 1-5" and state the total count. Do NOT enumerate every occurrence.
-- Do NOT wrap your response in markdown code fences (```). Output plain Markdown directly.\
+- Do NOT wrap your response in markdown code fences (```). Output plain Markdown directly.
+"""
+
+_SYSTEM_PROMPT_FIELD_TEMPLATE = """
+Your field of expertise: {field}.
+
+Begin the report with this header line:
+
+**Expert analysis by: {field} specialist** ({detection_note})\
 """
 
 
+# Keyword hints per professional field, matched by _detect_field()
+_FIELD_KEYWORDS = (
+    ("tax law and international taxation", ["tax", "globe", "pillar two", "oecd", "beps", "minimum tax", "jurisdict"]),
+    ("legal and regulatory compliance", ["compliance", "regulation", "statute", "legislation", "ordinance", "enact"]),
+    ("contract law", ["contract", "agreement", "clause", "party", "indemnif", "liability", "breach", "termination"]),
+    ("finance and accounting", ["financial", "revenue", "audit", "balance sheet", "fiscal", "gaap", "ifrs"]),
+    ("healthcare and medical sciences", ["patient", "clinical", "diagnosis", "treatment", "medical", "pharma", "dosage"]),
+    ("software engineering", ["api", "endpoint", "function", "database", "deploy", "server", "bug", "release"]),
+    ("insurance", ["policy", "premium", "claim", "underwriting", "coverage", "insured", "deductible"]),
+    ("intellectual property", ["patent", "trademark", "copyright", "infringement", "intellectual property", "licensing"]),
+    ("human resources", ["employee", "compensation", "benefits", "hiring", "termination", "workforce", "payroll"]),
+    ("environmental science and policy", ["emission", "carbon", "climate", "environmental", "pollution", "sustainability"]),
+    ("education", ["curriculum", "student", "assessment", "syllabus", "academic", "grading"]),
+    ("real estate", ["property", "lease", "tenant", "mortgage", "zoning", "escrow"]),
+)
+
+# The same keywords with a leading space: searched for in the sample's words
+# joined by single spaces, so each one only matches at the start of a word
+# ("tax" hits "tax" and "taxation" but not "syntax") and multi-word keywords
+# still match across any run of whitespace or punctuation
+_FIELD_KEYWORD_STARTS = tuple(
+    (field, tuple(" " + kw for kw in keywords)) for field, keywords in _FIELD_KEYWORDS
+)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+
 def _detect_field(unified_diff: str) -> str:
     """Detect the professional domain from a sample of the diff content.
 
     Uses simple keyword matching on the first ~2000 characters to identify the
-    document's field. Falls back to "document analysis" if no field is detected.
+    document's field. Keywords match at word starts only. Falls back to
+    "document analysis" if no field is detected.
     """
-    sample = unified_diff[:2000].lower()
-
-    field_keywords = [
-        ("tax law and international taxation", ["tax", "globe", "pillar two", "oecd", "beps", "minimum tax", "jurisdict"]),
-        ("legal and regulatory compliance", ["compliance", "regulation", "statute", "legislation", "ordinance", "enact"]),
-        ("contract law", ["contract", "agreement", "clause", "party", "indemnif", "liability", "breach", "termination"]),
-        ("finance and accounting", ["financial", "revenue", "audit", "balance sheet", "fiscal", "gaap", "ifrs"]),
-        ("healthcare and medical sciences", ["patient", "clinical", "diagnosis", "treatment", "medical", "pharma", "dosage"]),
-        ("software engineering", ["api", "endpoint", "function", "database", "deploy", "server", "bug", "release"]),
-        ("insurance", ["policy", "premium", "claim", "underwriting", "coverage", "insured", "deductible"]),
-        ("intellectual property", ["patent", "trademark", "copyright", "infringement", "intellectual property", "licensing"]),
-        ("human resources", ["employee", "compensation", "benefits", "hiring", "termination", "workforce", "payroll"]),
-        ("environmental science and policy", ["emission", "carbon", "climate", "environmental", "pollution", "sustainability"]),
-        ("education", ["curriculum", "student", "assessment", "syllabus", "academic", "grading"]),
-        ("real estate", ["property", "lease", "tenant", "mortgage", "zoning", "escrow"]),
-    ]
+    return _detect_field_in_sample(unified_diff[:2000])
+
+
+@lru_cache(maxsize=128)
+def _detect_field_in_sample(sample: str) -> str:
+    """Keyword scoring behind _detect_field(), memoised per diff sample so
+    retries and regenerations on the same diff skip the scan."""
+    sample = " " + " ".join(_WORD_RE.findall(sample.lower()))
 
     best_field = "document analysis"
     best_count = 0
-    for field, keywords in field_keywords:
+    for field, keywords in _FIELD_KEYWORD_STARTS:
         count = sum(1 for kw in keywords if kw in sample)
         if count > best_count:
             best_count = count
@@ -146,13 +298,21 @@ def _detect_field(unified_diff: str) -> str:
 
 def _build_system_prompt(unified_diff: str, expert_field: str = "") -> str:
     """Build a system prompt tailored to the document's professional domain."""
+    # Only the first 2000 characters feed field detection, so they and the
+    # expert field fully determine the prompt
+    return _system_prompt_for(unified_diff[:2000], expert_field)
+
+
+@lru_cache(maxsize=64)
+def _system_prompt_for(sample: str, expert_field: str) -> str:
+    """Return the full system prompt for one (diff sample, expert field) pair."""
     if expert_field:
         field = expert_field
         detection_note = "manually selected"
     else:
-        field = _detect_field(unified_diff)
+        field = _detect_field(sample)
         detection_note = "auto-detected" if field != "document analysis" else "general"
-    return _SYSTEM_PROMPT_TEMPLATE.format(field=field, detection_note=detection_note)
+    return _SYSTEM_PROMPT + _SYSTEM_PROMPT_FIELD_TEMPLATE.format(field=field, detection_note=detection_note)
 
 
 # ---------------------------------------------------------------------------
@@ -169,15 +329,229 @@ _BLOCKED_HOSTS = {
     "100.100.100.200",          # Alibaba Cloud metadata
 }
 
+# Address ranges refused even with allow_local: metadata services live on
+# link-local (and Alibaba's outside any private range), and an unspecified
+# address dials the local machine under another name
+_BLOCKED_NETS = tuple(ipaddress.ip_network(n) for n in (
+    "0.0.0.0/8",                # "this network", incl. 0.0.0.0
+    "169.254.0.0/16",           # IPv4 link-local, incl. most metadata services
+    "100.100.100.200/32",       # Alibaba Cloud metadata
+    "::/128",                   # IPv6 unspecified
+    "fe80::/10",                # IPv6 link-local
+    "fd00:ec2::254/128",        # AWS EC2 metadata over IPv6
+))
+
+
+# Resolved addresses per (hostname, port).  Short-lived so DNS changes still
+# propagate; bounded so arbitrary user-supplied hosts cannot grow it.
+_DNS_CACHE_SIZE = 128
+_DNS_CACHE_TTL = 60.0
+_dns_cache: dict = {}
+_dns_cache_lock = threading.Lock()
+
+
+def _resolve(hostname: str, port: int) -> list:
+    """Return ``getaddrinfo`` results for *hostname*, cached for a minute."""
+    key = (hostname, port)
+    now = time.monotonic()
+    with _dns_cache_lock:
+        entry = _dns_cache.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+    infos = socket.getaddrinfo(hostname, port, proto=socket.IPPROTO_TCP)
+    with _dns_cache_lock:
+        _dns_cache.pop(key, None)
+        if len(_dns_cache) >= _DNS_CACHE_SIZE:
+            # Drop the oldest entry (dicts keep insertion order)
+            del _dns_cache[next(iter(_dns_cache))]
+        _dns_cache[key] = (now + _DNS_CACHE_TTL, infos)
+    return infos
+
+
+def _retry_delay(attempt: int, retry_after) -> float:
+    """Seconds to wait before retry number *attempt* (0-based).
+
+    A numeric Retry-After header wins over the backoff schedule; HTTP-date
+    values are rare from LLM APIs and fall back to the schedule.
+    """
+    if retry_after and retry_after.strip().isdigit():
+        return min(float(retry_after), _RETRY_MAX_DELAY)
+    return (1 << attempt) + random.random()
+
+
+def _open_llm_response(url: str, body: bytes, headers: dict, timeout, addresses=None):
+    """POST *body* over a pooled connection and return ``(key, conn, resp)``.
+
+    Only successful (2xx) responses are returned; redirects and HTTP errors
+    raise ValueError with a sanitized message.  Statuses in
+    ``_RETRY_STATUSES`` are retried, resending the same *body* bytes, until
+    it has been sent ``_RETRY_ATTEMPTS`` times or the next wait would pass
+    ``_RETRY_DEADLINE``; the error reply is drained first so the connection
+    goes back to the pool.  New connections dial *addresses* (see
+    ``_checkout()``).  The caller reads *resp* and then hands the connection
+    back with ``_release()``.
+    """
+    parsed = _parse_url(url)
+    key = _pool_key(parsed)
+    path = (parsed.path or "/") + (f"?{parsed.query}" if parsed.query else "")
+    attempt = 0
+    deadline = time.monotonic() + _RETRY_DEADLINE
+    while True:
+        conn, reused = _checkout(key, addresses)
+        try:
+            if conn.sock is None:
+                conn.connect()
+            conn.sock.settimeout(timeout)
+            conn.request("POST", path, body=body, headers={"User-Agent": _USER_AGENT, **headers})
+            resp = conn.getresponse()
+        except _STALE_ERRORS as e:
+            conn.close()
+            if reused:
+                continue  # idle connection dropped by the server; retry on a fresh one
+            raise ValueError(f"LLM request failed: {e}") from None
+        except (OSError, http.client.HTTPException) as e:
+            conn.close()
+            raise ValueError(f"LLM request failed: {e}") from None
+        if resp.status in _RETRY_STATUSES and attempt + 1 < _RETRY_ATTEMPTS:
+            delay = _retry_delay(attempt, resp.getheader("Retry-After"))
+            if time.monotonic() + delay > deadline:
+                break
+            try:
+                resp.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+            else:
+                _release(key, conn, resp)
+            attempt += 1
+            time.sleep(delay)
+            continue
+        break
+    if resp.status >= 300:
+        conn.close()
+        if resp.status < 400:
+            raise ValueError("Redirects are not allowed for LLM endpoints")
+        raise ValueError(f"LLM request failed with HTTP {resp.status}")
+    return key, conn, resp
+
+
+def _release(key: tuple, conn, resp) -> None:
+    """Return *conn* to the pool once *resp* has been read to the end."""
+    if resp.will_close:
+        conn.close()
+    else:
+        _checkin(key, conn)
+
+
+def _safe_llm_request(url: str, body: bytes, headers: dict, timeout=300, addresses=None) -> bytes:
+    """POST *body* to an LLM endpoint, sanitizing errors to avoid leaking API keys.
+
+    The request goes over a pooled keep-alive connection so repeated calls to
+    the same provider skip the TCP/TLS handshake.  *timeout* bounds each read
+    of the response; connecting is bounded by ``_CONNECT_TIMEOUT``.  Replies
+    may be gzip-compressed on the wire.  Returns the decoded response body.
+    """
+    key, conn, resp = _open_llm_response(url, body, {**headers, "Accept-Encoding": "gzip"}, timeout,
+                                         addresses)
+    try:
+        data = resp.read()
+    except (OSError, http.client.HTTPException) as e:
+        conn.close()
+        raise ValueError(f"LLM request failed: {e}") from None
+    _release(key, conn, resp)
+    if (resp.getheader("Content-Encoding") or "").lower() == "gzip":
+        try:
+            data = gzip.decompress(data)
+        except (OSError, EOFError, zlib.error):
+            raise ValueError("LLM request failed: malformed compressed response") from None
+    return data
+
+
+def _stream_llm_events(url: str, body: bytes, headers: dict, timeout=300, addresses=None):
+    """POST *body* and yield each JSON event of a streamed response.
+
+    Handles both server-sent events (``data: {...}`` lines) and NDJSON
+    (one object per line); blank lines, ``event:`` fields, comments and the
+    ``[DONE]`` terminator are skipped.  The connection is pooled again only
+    if the stream was read to the end.
+    """
+    key, conn, resp = _open_llm_response(url, body, headers, timeout, addresses)
+    finished = False
+    try:
+        for line in resp:
+            line = line.strip()
+            if line.startswith(b"data:"):
+                line = line[5:].lstrip()
+            if line.startswith(b"{"):
+                yield orjson.loads(line)
+        finished = True
+    except (OSError, http.client.HTTPException) as e:
+        raise ValueError(f"LLM request failed: {e}") from None
+    finally:
+        if finished:
+            _release(key, conn, resp)
+        else:
+            conn.close()
+
+
+def _stream_text(events, keys: tuple, on_chunk) -> str:
+    """Pass each text piece found at *keys* in *events* to *on_chunk*.
+
+    Events without text at that path (message start/stop, usage totals)
+    are skipped.  Returns the concatenated text.
+    """
+    pieces = []
+    for event in events:
+        if "error" in event:
+            raise ValueError("LLM stream reported an error")
+        try:
+            piece = _extract_response(event, *keys)
+        except ValueError:
+            continue
+        if piece:
+            pieces.append(piece)
+            on_chunk(piece)
+    if not pieces:
+        raise ValueError("Unexpected LLM response format")
+    return "".join(pieces)
+
+
+# Request bodies smaller than this are sent uncompressed even with
+# LLM_GZIP_REQUESTS, since gzip framing outweighs the saving
+_GZIP_MIN_BODY = 2048
+
 
-def _safe_llm_request(req, timeout=300):
-    """Execute an LLM HTTP request, sanitizing errors to avoid leaking API keys."""
+def _post_for_text(url: str, body: bytes, headers: dict, keys: tuple, stream_keys: tuple, on_chunk,
+                   compress: bool = False, addresses: list | None = None) -> str:
+    """POST a provider request and return the reply text.
+
+    The one response path shared by every provider: the body is read,
+    decoded and reduced to the string at *keys*, or, with *on_chunk*, the
+    streamed events are reduced piece by piece at *stream_keys*.  Cloud
+    providers pass *compress* so large bodies are gzipped when
+    ``LLM_GZIP_REQUESTS`` is enabled.  *addresses* are the endpoint's
+    vetted ``getaddrinfo`` results from _validate_endpoint().
+    """
+    if compress and LLM_GZIP_REQUESTS and len(body) >= _GZIP_MIN_BODY:
+        body = gzip.compress(body, compresslevel=1)
+        headers = {**headers, "Content-Encoding": "gzip"}
+    if on_chunk is not None:
+        events = _stream_llm_events(url, body, headers, addresses=addresses)
+        return _stream_text(events, stream_keys, on_chunk)
+    data = _safe_llm_request(url, body, headers, addresses=addresses)
+    return _extract_response(orjson.loads(data), *keys)
+
+
+def _dumps(payload) -> bytes:
+    """Serialize a request body as compact UTF-8 JSON.
+
+    orjson refuses lone surrogates, which a JSON request to /api/llm-report
+    can carry into the diff text; such payloads go through the stdlib
+    encoder with the surrogates replaced.
+    """
     try:
-        return _opener.open(req, timeout=timeout)
-    except urllib.error.HTTPError as e:
-        raise ValueError(f"LLM request failed with HTTP {e.code}") from None
-    except urllib.error.URLError as e:
-        raise ValueError(f"LLM request failed: {e.reason}") from None
+        return orjson.dumps(payload)
+    except TypeError:
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8", "replace")
 
 
 def _extract_response(data, *keys):
@@ -199,16 +573,17 @@ def _extract_response(data, *keys):
     return current
 
 
-def _validate_endpoint(url: str, *, allow_local: bool = False) -> None:
+def _validate_endpoint(url: str, *, allow_local: bool = False) -> list:
     """Validate an LLM endpoint URL to block SSRF attempts.
 
     Resolves the hostname to an IP and rejects private/loopback addresses,
-    known cloud-metadata endpoints, and ambiguous schemes.
+    known cloud-metadata endpoints, and ambiguous schemes.  Returns the
+    vetted ``getaddrinfo`` results, which the request must then dial.
 
     If *allow_local* is True, loopback and private addresses are permitted
     (used for providers like Ollama that run on the local machine).
     """
-    parsed = urlparse(url)
+    parsed = _parse_url(url)
     if parsed.fragment:
         raise ValueError("Fragment identifiers are not allowed in LLM endpoint URLs")
     if parsed.scheme not in _ALLOWED_SCHEMES:
@@ -216,33 +591,92 @@ def _validate_endpoint(url: str, *, allow_local: bool = False) -> None:
     hostname = parsed.hostname or ""
     if hostname in _BLOCKED_HOSTS:
         raise ValueError("This endpoint address is not allowed")
-    # Block 0-prefixed IPs and IPv6 unspecified address
-    if hostname.startswith("0") or hostname == "[::]":
-        raise ValueError("This endpoint address is not allowed")
 
     # Resolve hostname and check all resulting IPs against private ranges
     try:
-        infos = socket.getaddrinfo(hostname, parsed.port or 443, proto=socket.IPPROTO_TCP)
+        infos = _resolve(hostname, _pool_key(parsed)[2])
     except socket.gaierror:
         raise ValueError(f"Cannot resolve hostname: {hostname}")
 
+    # Check each resolved address, so that numeric spellings such as
+    # 0x7f.1 or 2852039166 and names pointing at blocked ranges are caught
     for family, _, _, _, sockaddr in infos:
-        ip = ipaddress.ip_address(sockaddr[0])
+        ip = ipaddress.ip_address(sockaddr[0].split("%", 1)[0])
+        # ::ffff:a.b.c.d reaches the IPv4 host a.b.c.d, so check that address
+        ip = getattr(ip, "ipv4_mapped", None) or ip
+        if any(ip in net for net in _BLOCKED_NETS):
+            raise ValueError("This endpoint address is not allowed")
         if not allow_local:
             if ip.is_reserved or ip.is_link_local or ip.is_private or ip.is_loopback:
                 raise ValueError("This endpoint address is not allowed")
+    return infos
 
 
 # ---------------------------------------------------------------------------
 # Prompt builder
 # ---------------------------------------------------------------------------
 
+def _truncate_diff(unified_diff: str, limit: int) -> str:
+    """Keep the head and tail of a diff longer than *limit* characters.
+
+    Both halves are cut back to whole lines and the gap is replaced by a
+    marker stating how many lines were left out.
+    """
+    if len(unified_diff) <= limit:
+        return unified_diff
+    half = limit // 2
+    head_end = unified_diff.rfind("\n", 0, half)
+    head_end = half if head_end < 0 else head_end
+    tail_start = unified_diff.find("\n", len(unified_diff) - half)
+    tail_start = len(unified_diff) - half if tail_start < 0 else tail_start + 1
+    omitted = unified_diff.count("\n", head_end + 1, tail_start)
+    return (
+        f"{unified_diff[:head_end]}\n"
+        f"... [{omitted} lines omitted] ...\n"
+        f"{unified_diff[tail_start:]}"
+    )
+
+
+@lru_cache(maxsize=1)
+def _token_encoding():
+    """Return the tokenizer used for MAX_DIFF_TOKENS, loaded on first use.
+
+    cl100k_base matches the OpenAI chat models exactly and is a close
+    enough estimate for the other providers' tokenizers.
+    """
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def _cap_diff(unified_diff: str) -> str:
+    """Truncate a diff to ``MAX_DIFF_CHARS`` and, if set, ``MAX_DIFF_TOKENS``.
+
+    The token budget is met by shrinking the character limit in proportion
+    to the measured characters per token, re-counting after each cut
+    because the kept head and tail can be denser than the diff as a whole.
+    The result is still cut at line boundaries with the usual
+    omitted-lines marker.
+    """
+    capped = _truncate_diff(unified_diff, MAX_DIFF_CHARS)
+    if MAX_DIFF_TOKENS <= 0 or tiktoken is None:
+        return capped
+    encoding = _token_encoding()
+    limit = len(capped)
+    tokens = len(encoding.encode(capped, disallowed_special=()))
+    while tokens > MAX_DIFF_TOKENS and limit > 0:
+        limit = limit * MAX_DIFF_TOKENS // tokens
+        capped = _truncate_diff(unified_diff, limit)
+        tokens = len(encoding.encode(capped, disallowed_special=()))
+    return capped
+
+
 def _build_user_prompt(unified_diff: str, stats: dict, name_a: str, name_b: str) -> str:
     """Assemble the user-role message sent to the LLM.
 
-    Includes document names, change statistics, and the full unified diff
-    wrapped in a fenced code block.
+    Includes document names, change statistics, and the unified diff
+    (capped at ``MAX_DIFF_CHARS``/``MAX_DIFF_TOKENS``) wrapped in a fenced
+    code block.
     """
+    unified_diff = _cap_diff(unified_diff)
     return (
         f"## Documents\n"
         f"- **Document A:** {name_a}\n"
@@ -260,268 +694,256 @@ def _build_user_prompt(unified_diff: str, stats: dict, name_a: str, name_b: str)
 # Provider implementations
 # ===========================================================================
 
-def _call_ollama(config: dict, system: str, user: str) -> str:
+# Default endpoint per provider, used when config["endpoint"] is not set.
+# Ollama's is a base URL; Gemini's is formatted with the model name.
+_DEFAULT_ENDPOINTS = {
+    "ollama": "http://localhost:11434",
+    "openai": "https://api.openai.com/v1/chat/completions",
+    "gemini": "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent",
+    "lmstudio": "http://localhost:1234/v1/chat/completions",
+    "anthropic": "https://api.anthropic.com/v1/messages",
+    "mistral": "https://api.mistral.ai/v1/chat/completions",
+    "groq": "https://api.groq.com/openai/v1/chat/completions",
+    "deepseek": "https://api.deepseek.com/chat/completions",
+    "kimi": "https://api.moonshot.cn/v1/chat/completions",
+    "perplexity": "https://api.perplexity.ai/chat/completions",
+}
+
+# Providers that normally run on this machine, so loopback/private
+# addresses are allowed
+_LOCAL_PROVIDERS = {"ollama", "lmstudio"}
+
+
+def _call_ollama(config: dict, system: str, user: str, on_chunk=None) -> str:
     """Call a local Ollama server using the /api/chat endpoint.
 
     Ollama does not require an API key.  The endpoint defaults to
     http://localhost:11434 but can be overridden via config["endpoint"].
+    With *on_chunk*, the reply is streamed as NDJSON.
     """
-    base = config.get("endpoint", "http://localhost:11434").rstrip("/")
+    base = config.get("endpoint", _DEFAULT_ENDPOINTS["ollama"]).rstrip("/")
     url = base + "/api/chat"
-    _validate_endpoint(url, allow_local=True)
+    addresses = _validate_endpoint(url, allow_local=True)
 
-    body = json.dumps({
+    body = _dumps({
         "model": config.get("model", "llama3.3:70b"),
         "messages": [
             {"role": "system", "content": system},
             {"role": "user", "content": user},
         ],
-        "stream": False,  # wait for the full response
-    }).encode()
+        "stream": on_chunk is not None,
+    })
 
-    req = urllib.request.Request(url, data=body, headers={"Content-Type": "application/json"})
-    with _safe_llm_request(req) as resp:
-        data = json.loads(resp.read())
-    return _extract_response(data, "message", "content")
+    headers = {"Content-Type": "application/json"}
+    return _post_for_text(url, body, headers, ("message", "content"), ("message", "content"), on_chunk,
+                          addresses=addresses)
 
 
-def _call_openai(config: dict, system: str, user: str) -> str:
-    """Call the OpenAI Chat Completions API (or any compatible endpoint).
+def _make_openai_compat(provider: str, default_model: str):
+    """Build the call function for an OpenAI-compatible Chat Completions API.
 
-    Requires config["api_key"].  Defaults to the official OpenAI endpoint
-    but can target any OpenAI-compatible server via config["endpoint"].
+    The endpoint defaults to ``_DEFAULT_ENDPOINTS[provider]`` and can be
+    overridden via config["endpoint"].  Local providers (LM Studio) may use
+    loopback/private addresses and only send an API key when one is given —
+    LM Studio ignores it, but some compatible servers require one.  With
+    *on_chunk*, the reply is streamed as server-sent events.
     """
-    api_key = config.get("api_key", "")
-    url = config.get("endpoint", "https://api.openai.com/v1/chat/completions")
-    _validate_endpoint(url)
+    local = provider in _LOCAL_PROVIDERS
 
-    body = json.dumps({
-        "model": config.get("model", "gpt-5.2"),
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-    }).encode()
+    def _call(config: dict, system: str, user: str, on_chunk=None) -> str:
+        url = config.get("endpoint", _DEFAULT_ENDPOINTS[provider])
+        addresses = _validate_endpoint(url, allow_local=local)
 
-    req = urllib.request.Request(url, data=body, headers={
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    })
-    with _safe_llm_request(req) as resp:
-        data = json.loads(resp.read())
-    return _extract_response(data, "choices", 0, "message", "content")
+        payload = {
+            "model": config.get("model", default_model),
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": user},
+            ],
+        }
+        if on_chunk is not None:
+            payload["stream"] = True
+        body = _dumps(payload)
+
+        headers = {"Content-Type": "application/json"}
+        api_key = config.get("api_key", "")
+        if api_key or not local:
+            headers["Authorization"] = f"Bearer {api_key}"
+
+        return _post_for_text(url, body, headers, ("choices", 0, "message", "content"),
+                              ("choices", 0, "delta", "content"), on_chunk, compress=not local,
+                              addresses=addresses)
 
+    _call.__name__ = _call.__qualname__ = f"_call_{provider}"
+    return _call
 
-def _call_gemini(config: dict, system: str, user: str) -> str:
+
+def _call_gemini(config: dict, system: str, user: str, on_chunk=None) -> str:
     """Call the Google Gemini (Generative Language) API.
 
     Authenticates via the ``x-goog-api-key`` header (not a URL query param)
-    to avoid leaking the key in logs or referer headers.
+    to avoid leaking the key in logs or referer headers.  With *on_chunk*,
+    the request goes to ``:streamGenerateContent`` with server-sent events.
     """
     api_key = config.get("api_key", "")
     model = config.get("model", "gemini-3-pro")
-    url = config.get(
-        "endpoint",
-        f"https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent",
-    )
-    _validate_endpoint(url)
+    url = config.get("endpoint", _DEFAULT_ENDPOINTS["gemini"].format(model=model))
+    addresses = _validate_endpoint(url)
 
-    body = json.dumps({
+    body = _dumps({
         "system_instruction": {"parts": [{"text": system}]},
         "contents": [{"parts": [{"text": user}]}],
-    }).encode()
+    })
 
-    req = urllib.request.Request(url, data=body, headers={
+    headers = {
         "Content-Type": "application/json",
         "x-goog-api-key": api_key,
-    })
-    with _safe_llm_request(req) as resp:
-        data = json.loads(resp.read())
-    return _extract_response(data, "candidates", 0, "content", "parts", 0, "text")
+    }
+    if on_chunk is not None:
+        url = url.replace(":generateContent", ":streamGenerateContent", 1)
+        url += ("&" if "?" in url else "?") + "alt=sse"
+    keys = ("candidates", 0, "content", "parts", 0, "text")
+    return _post_for_text(url, body, headers, keys, keys, on_chunk, compress=True, addresses=addresses)
 
 
-def _call_lmstudio(config: dict, system: str, user: str) -> str:
-    """Call a local LM Studio server using its OpenAI-compatible API.
+def _call_anthropic(config: dict, system: str, user: str, on_chunk=None) -> str:
+    """Call the Anthropic Messages API for Claude models.
 
-    LM Studio does not require an API key.  The endpoint defaults to
-    http://localhost:1234/v1/chat/completions but can be overridden via
-    config["endpoint"].
+    The shared instruction block is marked with ``cache_control`` so
+    Anthropic's prompt cache serves it on repeat calls; only the
+    per-document tail is processed afresh.  With *on_chunk*, the reply is
+    streamed as server-sent events.
     """
-    url = config.get("endpoint", "http://localhost:1234/v1/chat/completions")
-    _validate_endpoint(url, allow_local=True)
-
-    body = json.dumps({
-        "model": config.get("model", "default"),
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-    }).encode()
-
-    # API key is optional — LM Studio ignores it, but some compatible
-    # servers may require one, so include it when provided.
-    headers = {"Content-Type": "application/json"}
-    api_key = config.get("api_key", "")
-    if api_key:
-        headers["Authorization"] = f"Bearer {api_key}"
-
-    req = urllib.request.Request(url, data=body, headers=headers)
-    with _safe_llm_request(req) as resp:
-        data = json.loads(resp.read())
-    return _extract_response(data, "choices", 0, "message", "content")
-
-
-# Lookup table mapping provider name → call function
-def _call_anthropic(config: dict, system: str, user: str) -> str:
-    """Call the Anthropic Messages API for Claude models."""
     api_key = config.get("api_key", "")
-    url = config.get("endpoint", "https://api.anthropic.com/v1/messages")
-    _validate_endpoint(url)
+    url = config.get("endpoint", _DEFAULT_ENDPOINTS["anthropic"])
+    addresses = _validate_endpoint(url)
+
+    if system.startswith(_SYSTEM_PROMPT):
+        system_blocks = [
+            {"type": "text", "text": _SYSTEM_PROMPT, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": system[len(_SYSTEM_PROMPT):]},
+        ]
+    else:
+        system_blocks = system
 
-    body = json.dumps({
+    payload = {
         "model": config.get("model", "claude-opus-4-5-20251101"),
         "max_tokens": 8192,
-        "system": system,
+        "system": system_blocks,
         "messages": [{"role": "user", "content": user}],
-    }).encode()
+    }
+    if on_chunk is not None:
+        payload["stream"] = True
+    body = _dumps(payload)
 
-    req = urllib.request.Request(url, data=body, headers={
+    headers = {
         "Content-Type": "application/json",
         "x-api-key": api_key,
         "anthropic-version": "2023-06-01",
-    })
-    with _safe_llm_request(req) as resp:
-        data = json.loads(resp.read())
-    return _extract_response(data, "content", 0, "text")
+    }
+    return _post_for_text(url, body, headers, ("content", 0, "text"), ("delta", "text"), on_chunk,
+                          compress=True, addresses=addresses)
 
 
-def _call_mistral(config: dict, system: str, user: str) -> str:
-    """Call the Mistral AI Chat API (OpenAI-compatible)."""
-    api_key = config.get("api_key", "")
-    url = config.get("endpoint", "https://api.mistral.ai/v1/chat/completions")
-    _validate_endpoint(url)
-
-    body = json.dumps({
-        "model": config.get("model", "mistral-large-3"),
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-    }).encode()
-
-    req = urllib.request.Request(url, data=body, headers={
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    })
-    with _safe_llm_request(req) as resp:
-        data = json.loads(resp.read())
-    return _extract_response(data, "choices", 0, "message", "content")
-
-
-def _call_groq(config: dict, system: str, user: str) -> str:
-    """Call the Groq API (OpenAI-compatible, fast inference)."""
-    api_key = config.get("api_key", "")
-    url = config.get("endpoint", "https://api.groq.com/openai/v1/chat/completions")
-    _validate_endpoint(url)
-
-    body = json.dumps({
-        "model": config.get("model", "llama-3.3-70b-versatile"),
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-    }).encode()
-
-    req = urllib.request.Request(url, data=body, headers={
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    })
-    with _safe_llm_request(req) as resp:
-        data = json.loads(resp.read())
-    return _extract_response(data, "choices", 0, "message", "content")
-
-
-def _call_deepseek(config: dict, system: str, user: str) -> str:
-    """Call the DeepSeek API (OpenAI-compatible)."""
-    api_key = config.get("api_key", "")
-    url = config.get("endpoint", "https://api.deepseek.com/chat/completions")
-    _validate_endpoint(url)
-
-    body = json.dumps({
-        "model": config.get("model", "deepseek-chat"),
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-    }).encode()
-
-    req = urllib.request.Request(url, data=body, headers={
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    })
-    with _safe_llm_request(req) as resp:
-        data = json.loads(resp.read())
-    return _extract_response(data, "choices", 0, "message", "content")
-
-
-def _call_kimi(config: dict, system: str, user: str) -> str:
-    """Call the Moonshot Kimi API (OpenAI-compatible)."""
-    api_key = config.get("api_key", "")
-    url = config.get("endpoint", "https://api.moonshot.cn/v1/chat/completions")
-    _validate_endpoint(url)
-
-    body = json.dumps({
-        "model": config.get("model", "kimi-k2.5"),
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-    }).encode()
-
-    req = urllib.request.Request(url, data=body, headers={
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    })
-    with _safe_llm_request(req) as resp:
-        data = json.loads(resp.read())
-    return _extract_response(data, "choices", 0, "message", "content")
+# Lookup table mapping provider name → call function
+_PROVIDERS = {
+    "ollama": _call_ollama,
+    "openai": _make_openai_compat("openai", "gpt-5.2"),
+    "gemini": _call_gemini,
+    "lmstudio": _make_openai_compat("lmstudio", "default"),
+    "anthropic": _call_anthropic,
+    "mistral": _make_openai_compat("mistral", "mistral-large-3"),
+    "groq": _make_openai_compat("groq", "llama-3.3-70b-versatile"),
+    "deepseek": _make_openai_compat("deepseek", "deepseek-chat"),
+    "kimi": _make_openai_compat("kimi", "kimi-k2.5"),
+    "perplexity": _make_openai_compat("perplexity", "sonar-pro"),
+}
 
 
-def _call_perplexity(config: dict, system: str, user: str) -> str:
-    """Call the Perplexity API (OpenAI-compatible)."""
-    api_key = config.get("api_key", "")
-    url = config.get("endpoint", "https://api.perplexity.ai/chat/completions")
-    _validate_endpoint(url)
+# ---------------------------------------------------------------------------
+# Report cache
+# ---------------------------------------------------------------------------
 
-    body = json.dumps({
-        "model": config.get("model", "sonar-pro"),
-        "messages": [
-            {"role": "system", "content": system},
-            {"role": "user", "content": user},
-        ],
-    }).encode()
+# Reports kept for LLM_CACHE_TTL seconds, keyed by a hash of everything that
+# determines the answer; least recently used entries are dropped first.
+# With LLM_CACHE_DIR set, reports are also written there as <key>.md so they
+# survive restarts and are shared between worker processes.
+_REPORT_CACHE_SIZE = 64
+_report_cache: OrderedDict = OrderedDict()
+_report_cache_lock = threading.Lock()
 
-    req = urllib.request.Request(url, data=body, headers={
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}",
-    })
-    with _safe_llm_request(req) as resp:
-        data = json.loads(resp.read())
-    return _extract_response(data, "choices", 0, "message", "content")
 
+def _report_cache_key(provider: str, config: dict, system: str, user: str) -> str:
+    """SHA-256 over the provider, model, endpoint and both prompts.
 
-_PROVIDERS = {
-    "ollama": _call_ollama,
-    "openai": _call_openai,
-    "gemini": _call_gemini,
-    "lmstudio": _call_lmstudio,
-    "anthropic": _call_anthropic,
-    "mistral": _call_mistral,
-    "groq": _call_groq,
-    "deepseek": _call_deepseek,
-    "kimi": _call_kimi,
-    "perplexity": _call_perplexity,
-}
+    Runs of whitespace in the user prompt are collapsed first, so a
+    regenerated PDF whose diff was only re-spaced still hits the earlier
+    report.  Hunk line ranges are kept: reports cite page/line numbers, so
+    a diff whose changes moved needs its own report.
+    """
+    user = " ".join(user.split())
+    digest = hashlib.sha256()
+    for part in (provider, config.get("model", ""), config.get("endpoint", ""), system, user):
+        digest.update(str(part).encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _remember_report(key: str, report: str, expires: float) -> None:
+    """Store *report* in memory until *expires* (monotonic), evicting LRU entries."""
+    with _report_cache_lock:
+        _report_cache[key] = (expires, report)
+        _report_cache.move_to_end(key)
+        while len(_report_cache) > _REPORT_CACHE_SIZE:
+            _report_cache.popitem(last=False)
+
+
+def _report_cache_get(key: str):
+    """Return the cached report for *key*, or None if absent or expired."""
+    with _report_cache_lock:
+        entry = _report_cache.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                _report_cache.move_to_end(key)
+                return entry[1]
+            del _report_cache[key]
+    if not LLM_CACHE_DIR:
+        return None
+    path = os.path.join(LLM_CACHE_DIR, key + ".md")
+    try:
+        remaining = os.path.getmtime(path) + LLM_CACHE_TTL - time.time()
+        if remaining <= 0:
+            return None
+        with open(path, encoding="utf-8") as f:
+            report = f.read()
+    except OSError:
+        return None
+    _remember_report(key, report, time.monotonic() + remaining)
+    return report
+
+
+def _report_cache_put(key: str, report: str) -> None:
+    """Store *report* under *key* in memory and, if configured, on disk.
+
+    Disk writes are best effort: they go through a temp file and rename so
+    readers never see a partial report, and expired files are pruned.
+    """
+    _remember_report(key, report, time.monotonic() + LLM_CACHE_TTL)
+    if not LLM_CACHE_DIR:
+        return
+    try:
+        os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=LLM_CACHE_DIR, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8", errors="replace") as f:
+            f.write(report)
+        os.replace(tmp, os.path.join(LLM_CACHE_DIR, key + ".md"))
+        cutoff = time.time() - LLM_CACHE_TTL
+        with os.scandir(LLM_CACHE_DIR) as entries:
+            for entry in entries:
+                if entry.name.endswith(".md") and entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+    except OSError:
+        pass
 
 
 # ===========================================================================
@@ -536,16 +958,21 @@ def generate_llm_report(
     name_a: str,
     name_b: str,
     expert_field: str = "",
+    on_chunk=None,
 ) -> str:
     """Generate a comparison report using the configured LLM provider.
 
     Args:
-        provider:     One of "ollama", "lmstudio", "openai", "gemini".
+        provider:     One of "ollama", "lmstudio", "openai", "gemini",
+                      "anthropic", "mistral", "groq", "deepseek", "kimi",
+                      "perplexity".
         config:       Dict with optional keys "api_key", "model", "endpoint".
         unified_diff: The unified diff text to analyse.
         stats:        Dict with equal/insert/delete/replace counts.
         name_a:       Filename of document A.
         name_b:       Filename of document B.
+        on_chunk:     Optional callable; when given, the reply is streamed
+                      and each text piece is passed to it as it arrives.
 
     Returns:
         Markdown report string produced by the LLM.
@@ -557,13 +984,112 @@ def generate_llm_report(
     if call_fn is None:
         raise ValueError(f"Unknown LLM provider: {provider!r}. Choose from: {list(_PROVIDERS)}")
 
-    user_prompt = _build_user_prompt(unified_diff, stats, name_a, name_b)
-
-    # Truncate the prompt if it exceeds ~80 K chars to stay within typical
+    # The diff is capped inside _build_user_prompt to stay within typical
     # LLM context windows and avoid excessive token costs
-    max_diff_chars = 80_000
-    if len(user_prompt) > max_diff_chars:
-        user_prompt = user_prompt[:max_diff_chars] + "\n\n[... diff truncated for length ...]\n"
+    user_prompt = _build_user_prompt(unified_diff, stats, name_a, name_b)
 
     system_prompt = _build_system_prompt(unified_diff, expert_field)
-    return call_fn(config, system_prompt, user_prompt)
+
+    def call() -> str:
+        if on_chunk is None:
+            return call_fn(config, system_prompt, user_prompt)
+        return call_fn(config, system_prompt, user_prompt, on_chunk=on_chunk)
+
+    if LLM_CACHE_TTL <= 0:
+        return call()
+
+    # Identical requests within the TTL reuse the earlier report
+    key = _report_cache_key(provider, config, system_prompt, user_prompt)
+    report = _report_cache_get(key)
+    if report is None:
+        report = call()
+        _report_cache_put(key, report)
+    elif on_chunk is not None:
+        on_chunk(report)
+    return report
+
+
+def generate_llm_reports_parallel(
+    provider_configs: list,
+    unified_diff: str,
+    stats: dict,
+    name_a: str,
+    name_b: str,
+    expert_field: str = "",
+) -> dict:
+    """Generate reports from several providers at once.
+
+    Args:
+        provider_configs: List of (provider, config) pairs, one per provider.
+        Other arguments:  As for :func:`generate_llm_report`.
+
+    Returns:
+        Dict mapping each provider to its Markdown report, or to the
+        exception it raised, so one failing provider does not discard the
+        others' reports.  Total time is that of the slowest provider.
+    """
+    if not provider_configs:
+        return {}
+    results = {}
+    with ThreadPoolExecutor(max_workers=min(8, len(provider_configs))) as executor:
+        futures = {
+            executor.submit(generate_llm_report, provider, config, unified_diff,
+                            stats, name_a, name_b, expert_field): provider
+            for provider, config in provider_configs
+        }
+        for future, provider in futures.items():
+            try:
+                results[provider] = future.result()
+            except Exception as e:
+                results[provider] = e
+    return results
+
+
+def prewarm(provider: str, config: dict) -> None:
+    """Open a pooled connection to *provider* ahead of its first report.
+
+    Only the TCP connect and TLS handshake are done; no HTTP request is
+    sent.  Best effort: unknown providers, blocked endpoints and network
+    errors are ignored, and nothing is done while an unexpired idle
+    connection is already pooled.
+    """
+    url = config.get("endpoint") or _DEFAULT_ENDPOINTS.get(provider)
+    if not url:
+        return
+    try:
+        key = _pool_key(_parse_url(url))
+        if _has_idle(key):
+            # Leave it alone: checking it out and back in would reset its
+            # idle time, so it would never expire while comparisons continue
+            return
+        addresses = _validate_endpoint(url, allow_local=provider in _LOCAL_PROVIDERS)
+        conn, reused = _checkout(key, addresses)
+        if not reused:
+            conn.connect()
+        _checkin(key, conn)
+    except (ValueError, OSError):
+        pass
+
+
+async def agenerate_llm_report(
+    provider: str,
+    config: dict,
+    unified_diff: str,
+    stats: dict,
+    name_a: str,
+    name_b: str,
+    expert_field: str = "",
+    on_chunk=None,
+) -> str:
+    """Async counterpart of :func:`generate_llm_report`.
+
+    The blocking provider call runs in a worker thread, so several reports
+    (different providers or expert fields) can be awaited together with
+    ``asyncio.gather`` and take as long as the slowest one.  Pooled
+    connections are shared with the sync API.  *on_chunk* is called from
+    that worker thread.
+    """
+    return await asyncio.to_thread(
+        generate_llm_report, provider, config, unified_diff, stats,
+        name_a, name_b, expert_field, on_chunk,
+    )
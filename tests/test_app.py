@@ -1,5 +1,7 @@
+import io
 import unittest
 import sys
+import threading
 import os
 from unittest.mock import patch, MagicMock
 
@@ -9,11 +11,51 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')
 import app
 import llm
 
+
+def make_pdf(*pages):
+    """Build a minimal PDF with one Helvetica text line per entry in *pages*.
+
+    A None entry makes a page with no content at all, like a scanned page
+    without its image.
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None,
+               b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        stream = b"" if text is None else f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+                       % (len(objects),))
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (b" ".join(kids), len(kids))
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
 class TestApp(unittest.TestCase):
 
     def setUp(self):
         self.app = app.app.test_client()
         self.app.testing = True
+        # Endpoint tests post many comparisons from the same address
+        app._rate_limits.clear()
+        app._extract_cache.clear()
+
+    def post_compare(self, pdf_a, pdf_b, **form):
+        """POST two PDF bodies to /api/compare."""
+        form["pdf_a"] = (io.BytesIO(pdf_a), "a.pdf")
+        form["pdf_b"] = (io.BytesIO(pdf_b), "b.pdf")
+        return self.app.post('/api/compare', data=form)
 
     def test_index(self):
         """Test that the index page loads."""
@@ -40,33 +82,38 @@ class TestApp(unittest.TestCase):
         safe_null = app._sanitize_metadata_value(null_byte)
         self.assertEqual(safe_null, "ValueWithNull")
 
-    def test_page_index_build(self):
-        """Test the O(1) page index builder."""
-        # Simulate 3 pages
+    def test_split_page_markers_page_numbers(self):
+        """Test that every content line is mapped to the page it appeared on."""
+        # Simulate 3 pages, with a line before the first sentinel
         lines = [
+            "Preamble",
             f"{app.PAGE_MARKER_PREFIX}1", "Line 1", "Line 2",
             f"{app.PAGE_MARKER_PREFIX}2", "Line 3",
             f"{app.PAGE_MARKER_PREFIX}3", "Line 4"
         ]
-        index = app._build_page_index(lines)
-        # Expected: 
-        # index[0] -> P1 (Marker)
-        # index[1] -> P1 (Line 1)
-        # index[2] -> P1 (Line 2)
-        # index[3] -> P2 (Marker)
-        # index[4] -> P2 (Line 3)
-        # index[5] -> P3 (Marker)
-        # index[6] -> P3 (Line 4)
-        expected = [1, 1, 1, 2, 2, 3, 3]
-        self.assertEqual(index, expected)
+        text, page_of = app._split_page_markers(lines)
+        self.assertEqual(text, ["Preamble", "Line 1", "Line 2", "Line 3", "Line 4"])
+        # Lines before any sentinel count as page 1
+        self.assertEqual(page_of, [1, 1, 1, 2, 3])
+
+    def test_split_page_markers(self):
+        """Test the single-pass sentinel stripper used by compute_diff."""
+        lines = [
+            f"{app.PAGE_MARKER_PREFIX}1", "Line 1", "Line 2",
+            f"{app.PAGE_MARKER_PREFIX}2",
+            f"{app.PAGE_MARKER_PREFIX}3", "Line 3"
+        ]
+        text, page_of = app._split_page_markers(lines)
+        self.assertEqual(text, ["Line 1", "Line 2", "Line 3"])
+        self.assertEqual(page_of, [1, 1, 3])
 
     def test_compute_diff_basic(self):
         """Test basic diff functionality."""
         lines_a = ["A", "B", "C"]
         lines_b = ["A", "X", "C"]
         
-        # We need to insert page markers for the function to work correctly
-        # because it calls _build_page_index internally
+        # compute_diff maps lines to pages by splitting out these sentinels
+        # with _split_page_markers
         lines_a_full = [f"{app.PAGE_MARKER_PREFIX}1"] + lines_a
         lines_b_full = [f"{app.PAGE_MARKER_PREFIX}1"] + lines_b
 
@@ -78,6 +125,57 @@ class TestApp(unittest.TestCase):
         # Verify block structure
         self.assertTrue(any(b['tag'] == 'replace' for b in blocks))
         
+    def test_pack_diff_blocks(self):
+        """Test the columnar diff_blocks form sent by /api/compare."""
+        blocks, _ = app.compute_diff([f"{app.PAGE_MARKER_PREFIX}1", "A", "B"],
+                                     [f"{app.PAGE_MARKER_PREFIX}1", "A", "X", "Y"])
+        packed = app._pack_diff_blocks(blocks)
+        self.assertEqual(packed["tag"], ["equal", "replace"])
+        self.assertEqual(packed["left_off"][0], packed["right_off"][0])  # equal lines stored once
+        table = packed["lines_table"]
+        off, n = packed["right_off"][1], packed["right_end"][1] - packed["right_start"][1]
+        self.assertEqual(table[off:off + n], ["X", "Y"])
+        self.assertIsNone(packed["word_diffs"][0])
+        self.assertEqual(len(packed["word_diffs"][1]), 2)
+
+    def test_line_opcodes_myers(self):
+        """Test that the Myers line diff produces difflib-shaped opcodes."""
+        a = ["A", "B", "C", "D"]
+        b = ["A", "X", "C", "D", "E"]
+        self.assertEqual(app._line_opcodes(a, b), [
+            ("equal", 0, 1, 0, 1),
+            ("replace", 1, 2, 1, 2),
+            ("equal", 2, 4, 2, 4),
+            ("insert", 4, 4, 4, 5),
+        ])
+
+    def test_line_opcodes_fallback(self):
+        """Test the SequenceMatcher fallback for very different documents."""
+        a = ["A", "B", "C"]
+        b = ["X", "Y", "C"]
+        with patch.object(app, "_MYERS_MAX_EDITS", 1):
+            opcodes = app._line_opcodes(a, b)
+        self.assertEqual(opcodes, [("replace", 0, 2, 0, 2), ("equal", 2, 3, 2, 3)])
+        with patch.object(app.config, "DIFF_ALGORITHM", "difflib"):
+            opcodes = app._line_opcodes(a, b)
+        self.assertEqual(opcodes, [("replace", 0, 2, 0, 2), ("equal", 2, 3, 2, 3)])
+
+    def test_word_diffs_padding(self):
+        """Test the one-sided fast path used for padded replace pairs."""
+        result = app.compute_word_diffs(["old line", "extra"], ["new line"])
+        self.assertEqual(result[1], {"left_spans": [["extra", "delete"]], "right_spans": []})
+        self.assertEqual(result[0]["right_spans"], [["new", "insert"], ["line", "equal"]])
+
+    def test_unified_diff_from_opcodes(self):
+        """Test that the opcode walker matches difflib.unified_diff output."""
+        import difflib
+        a = ["A", "B", "C", "D", "E", "F", "G", "H", "I", "J"]
+        b = ["A", "X", "C", "D", "E", "F", "G", "H", "I", "J", "K"]
+        opcodes = app._line_opcodes(a, b)
+        expected = "\n".join(difflib.unified_diff(a, b, fromfile="a.pdf", tofile="b.pdf", lineterm=""))
+        self.assertEqual(app.generate_unified_diff(a, b, opcodes, "a.pdf", "b.pdf"), expected)
+        self.assertEqual(app.generate_unified_diff(a, a, [("equal", 0, 10, 0, 10)]), "")
+
     def test_ignore_rules_whitespace(self):
         """Test whitespace ignoring rule."""
         lines = ["  Hello   World  ", f"{app.PAGE_MARKER_PREFIX}1"]
@@ -99,21 +197,235 @@ class TestApp(unittest.TestCase):
         # A classic evil regex that causes exponential backtracking
         # (a+)+$ matches aaaa... but fails on aaaa...b
         evil_pattern = r"(a+)+$"
-        # Long string of 'a's followed by 'b' - 30 'a's should be enough for > 2s
         target = "a" * 30 + "b"
-        
+
+        # Nested quantifiers are refused up front rather than timed out per line
+        self.assertIsNotNone(app._ignore_pattern_error(evil_pattern))
+        self.assertIsNone(app._ignore_pattern_error(r"Page \d+ of \d+"))
+        # Deeper nesting, brace repeats and overlapping alternation too
+        for pattern in (r"((a+))+", r"(.*a){20}", r"(a|aa)+$"):
+            self.assertIsNotNone(app._ignore_pattern_error(pattern), pattern)
+        # Single or optional groups, escapes and classes are fine
+        for pattern in (r"(?:Page \d+)?", r"(ab){1}", r"(\(x\))+",r"([+*]x)+", r"Draft (v\d+|final)"):
+            self.assertIsNone(app._ignore_pattern_error(pattern), pattern)
+
         options = {"ignore_pattern": evil_pattern}
-        
+
         import time
         start = time.time()
-        # Should timeout internally after 2 seconds and return the line as is
         result = app.apply_ignore_rules([target], options)
         duration = time.time() - start
-        
-        # It should take at least 2 seconds (the timeout)
-        self.assertGreaterEqual(duration, 2.0) 
+
+        self.assertLess(duration, 1.0)
         self.assertEqual(result[0], target)
 
+    def test_compare_broken_pool(self):
+        """Test that a dead extraction worker gets a 503 and a fresh pool."""
+        from concurrent.futures.process import BrokenProcessPool
+        broken = MagicMock()
+        broken.submit.side_effect = BrokenProcessPool("worker died")
+        with patch.object(app.config, "EXTRACT_WORKERS", 2), \
+                patch.object(app, "_extract_pool", broken):
+            response = self.post_compare(make_pdf("A"), make_pdf("B"))
+            self.assertEqual(response.status_code, 503)
+            self.assertIsNone(app._extract_pool)
+        broken.shutdown.assert_called_once()
+
+    def test_extract_cache(self):
+        """Test that repeat uploads are served from the extraction cache."""
+        pdf_a, pdf_b = make_pdf("Alpha"), make_pdf("Beta")
+        with patch.object(app.config, "EXTRACT_WORKERS", 1), \
+                patch.object(app, "_start_extraction", wraps=app._start_extraction) as extract:
+            first = self.post_compare(pdf_a, pdf_b)
+            second = self.post_compare(pdf_a, pdf_b, ignore_case="true")
+        self.assertEqual(extract.call_count, 2)  # once per document
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.get_json()["stats"], first.get_json()["stats"])
+
+    def test_extract_cache_eviction(self):
+        """Test LRU eviction at EXTRACT_CACHE_SIZE and that 0 disables the cache."""
+        pdfs = [make_pdf(text) for text in ("One", "Two", "Three")]
+
+        def extract(pdf):
+            lines, _ = app._start_cached_extraction(pdf)
+            return list(lines)
+
+        with patch.object(app.config, "EXTRACT_WORKERS", 1), \
+                patch.object(app.config, "EXTRACT_CACHE_SIZE", 2), \
+                patch.object(app, "_start_extraction", wraps=app._start_extraction) as start:
+            extract(pdfs[0])
+            extract(pdfs[1])
+            extract(pdfs[0])  # hit; "Two" is now least recently used
+            extract(pdfs[2])  # evicts "Two"
+            self.assertEqual(start.call_count, 3)
+            self.assertEqual(list(app._extract_cache),
+                             [app._pdf_digest(pdfs[0]), app._pdf_digest(pdfs[2])])
+            extract(pdfs[1])
+            self.assertEqual(start.call_count, 4)
+
+        app._extract_cache.clear()
+        with patch.object(app.config, "EXTRACT_WORKERS", 1), \
+                patch.object(app.config, "EXTRACT_CACHE_SIZE", 0), \
+                patch.object(app, "_start_extraction", wraps=app._start_extraction) as start:
+            self.assertEqual(extract(pdfs[0]), extract(pdfs[0]))
+            self.assertEqual(start.call_count, 2)
+            self.assertFalse(app._extract_cache)
+
+    def test_json_response_gzip(self):
+        """Test that large JSON bodies are gzipped for clients that accept it."""
+        import gzip
+        pdf = make_pdf(*(f"Page {n} text" for n in range(40)))
+        with patch.object(app.config, "EXTRACT_WORKERS", 1):
+            response = self.app.post('/api/compare', headers={"Accept-Encoding": "gzip"}, data={
+                "pdf_a": (io.BytesIO(pdf), "a.pdf"),
+                "pdf_b": (io.BytesIO(make_pdf("Other")), "b.pdf"),
+            })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(int(response.headers["Content-Length"]), len(response.data))
+        payload = app.orjson.loads(gzip.decompress(response.data))
+        self.assertGreaterEqual(len(app.orjson.dumps(payload)), app._GZIP_MIN_BYTES)
+        self.assertEqual(payload["name_a"], "a.pdf")
+
+    def test_json_response_small_uncompressed(self):
+        """Test that bodies under the gzip threshold are sent as plain JSON."""
+        response = self.app.get('/api/config', headers={"Accept-Encoding": "gzip"})
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(response.headers["Vary"], "Accept-Encoding")
+        self.assertEqual(int(response.headers["Content-Length"]), len(response.data))
+        self.assertIn("version", response.get_json())
+
+    def test_compare_identical_uploads(self):
+        """Test that the same PDF uploaded twice is extracted once and all equal."""
+        pdf = make_pdf("Same text", "Second page")
+        with patch.object(app.config, "EXTRACT_WORKERS", 1), \
+                patch.object(app, "_start_extraction", wraps=app._start_extraction) as extract:
+            response = self.post_compare(pdf, pdf)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(extract.call_count, 1)
+        data = response.get_json()
+        self.assertEqual(data["stats"], {"equal": 2, "insert": 0, "delete": 0, "replace": 0})
+        self.assertEqual(data["diff_blocks"]["tag"], ["equal"])
+        self.assertEqual(data["unified_diff"], "")
+
+    def test_compare_max_diff_lines(self):
+        """Test that documents over MAX_DIFF_LINES combined are refused with 413."""
+        with patch.object(app.config, "EXTRACT_WORKERS", 1), \
+                patch.object(app.config, "MAX_DIFF_LINES", 2):
+            response = self.post_compare(make_pdf("A", "B"), make_pdf("C"))
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("error", response.get_json())
+
+    @unittest.skipIf(app.pdfium is None, "pypdfium2 not installed")
+    def test_pdfium_skips_image_only_pages(self):
+        """Test that pages without text objects skip the pdfplumber fallback."""
+        pdf = make_pdf("Text page", None)
+        with patch.object(app.config, "PDF_ENGINE", "pdfium"), \
+                patch.object(app.pdfplumber, "open", wraps=app.pdfplumber.open) as plumber:
+            lines = list(app._iter_pdfium_pages(pdf))
+        self.assertEqual(lines, [f"{app.PAGE_MARKER_PREFIX}1", "Text page",
+                                 f"{app.PAGE_MARKER_PREFIX}2"])
+        plumber.assert_not_called()
+
+    def submit_job(self, pdf_a, pdf_b):
+        """Submit a comparison with COMPARE_ASYNC on; return (job id, future)."""
+        with patch.object(app.config, "COMPARE_ASYNC", True):
+            response = self.post_compare(pdf_a, pdf_b)
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()["job_id"]
+        return job_id, app._compare_jobs[job_id][1]
+
+    def test_compare_async_job(self):
+        """Test submitting a background comparison and collecting it once."""
+        release = threading.Event()
+        run_compare = app._run_compare
+
+        def blocked_compare(*args):
+            release.wait(5)
+            return run_compare(*args)
+
+        with patch.object(app.config, "EXTRACT_WORKERS", 1), \
+                patch.object(app, "_run_compare", blocked_compare):
+            job_id, future = self.submit_job(make_pdf("Alpha"), make_pdf("Beta"))
+            pending = self.app.get(f'/api/compare/{job_id}')
+            release.set()
+            future.result(timeout=5)
+        self.assertEqual(pending.status_code, 202)
+        self.assertEqual(pending.get_json(), {"status": "pending"})
+
+        done = self.app.get(f'/api/compare/{job_id}')
+        self.assertEqual(done.status_code, 200)
+        self.assertEqual(done.get_json()["stats"]["replace"], 1)
+        # A finished job is handed out once, then forgotten
+        self.assertEqual(self.app.get(f'/api/compare/{job_id}').status_code, 404)
+
+    def test_compare_async_unknown_and_expired(self):
+        """Test that unknown ids and uncollected jobs past their TTL return 404."""
+        self.assertEqual(self.app.get('/api/compare/nosuchjob').status_code, 404)
+        with patch.object(app.config, "EXTRACT_WORKERS", 1):
+            job_id, future = self.submit_job(make_pdf("Alpha"), make_pdf("Beta"))
+            future.result(timeout=5)
+            # The next submission prunes finished jobs older than the TTL
+            with patch.object(app, "_COMPARE_JOB_TTL", -1):
+                _, other = self.submit_job(make_pdf("Gamma"), make_pdf("Delta"))
+                other.result(timeout=5)
+        response = self.app.get(f'/api/compare/{job_id}')
+        self.assertEqual(response.status_code, 404)
+        self.assertIn("error", response.get_json())
+
+    def test_compare_async_failed_job(self):
+        """Test that a job that raised is reported as a 500 with a JSON error."""
+        with patch.object(app, "_run_compare", side_effect=RuntimeError("boom")):
+            job_id, future = self.submit_job(make_pdf("Alpha"), make_pdf("Beta"))
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=5)
+        with self.assertLogs(app.logger, "ERROR"):
+            response = self.app.get(f'/api/compare/{job_id}')
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.get_json(), {"error": "Comparison failed."})
+
+    def test_compare_rejects_non_pdf(self):
+        """Test that uploads without the %PDF- magic bytes get a 415."""
+        response = self.post_compare(b"GIF89a not a pdf", make_pdf("A"))
+        self.assertEqual(response.status_code, 415)
+        self.assertIn("error", response.get_json())
+
+    def test_compare_malformed_pdf(self):
+        """Test that a body passing the magic-byte sniff but unparseable gets a 422."""
+        garbage = b"%PDF-1.4\ngarbage garbage"
+        for workers in (1, 2):
+            with self.subTest(workers=workers), \
+                    patch.object(app.config, "EXTRACT_WORKERS", workers), \
+                    self.assertLogs(app.logger, "ERROR"):
+                response = self.post_compare(garbage, garbage)
+                self.assertEqual(response.status_code, 422)
+                self.assertIn("error", response.get_json())
+
+    def test_prewarm_single_thread(self):
+        """Test that comparisons start no new prewarm while one is running."""
+        release = threading.Event()
+        with patch.object(app.config, "LLM_PROVIDER", "ollama"), \
+                patch.object(app, "prewarm_llm", side_effect=lambda *args: release.wait(5)) as prewarm:
+            app._prewarm_default_llm()
+            app._prewarm_default_llm()
+            release.set()
+            with app._prewarm_lock:  # released once the first thread is done
+                pass
+        self.assertEqual(prewarm.call_count, 1)
+
+    def test_llm_report_transport_error(self):
+        """Test that a dropped LLM connection is a 502, not an unhandled 500."""
+        import http.client
+        body = {"provider": "openai", "unified_diff": "-a\n+b", "name_a": "a.pdf", "name_b": "b.pdf",
+                "stats": {"equal": 0, "insert": 0, "delete": 0, "replace": 1}}
+        with patch.object(app, "generate_llm_report",
+                          side_effect=http.client.RemoteDisconnected("closed")), \
+                self.assertLogs(app.logger, "ERROR"):
+            response = self.app.post('/api/llm-report', json=body)
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("error", response.get_json())
+
 
 if __name__ == '__main__':
     unittest.main()
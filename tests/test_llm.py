@@ -1,15 +1,34 @@
+import http.server
+import threading
 import unittest
 import sys
 import os
-import urllib.error
+from unittest.mock import patch
 
 # Add project root to sys.path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import llm
 
+
+class QuietHandler(http.server.BaseHTTPRequestHandler):
+    """Keep-alive request handler base for the test servers, without access logs."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+
 class TestLLM(unittest.TestCase):
 
+    def serve(self, handler):
+        """Serve *handler* on a loopback port for the rest of the test; return its base URL."""
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_port}"
+
     def test_detect_field(self):
         """Test domain detection logic."""
         legal_text = "The contract liability indemnification clause breach"
@@ -21,6 +40,18 @@ class TestLLM(unittest.TestCase):
         generic_text = "This is just some random text about apples."
         self.assertEqual(llm._detect_field(generic_text), "document analysis")
 
+        # Keywords match at word starts only: "syntax" is not a "tax" hit
+        self.assertEqual(llm._detect_field("Syntax of the globe-shaped widget"), "document analysis")
+        self.assertEqual(llm._detect_field("Taxation under Pillar\nTwo rules"), "tax law and international taxation")
+
+    def test_system_prompt_stable_prefix(self):
+        """Test that only the tail of the system prompt varies with the field."""
+        tax = llm._build_system_prompt("", "tax law")
+        auto = llm._build_system_prompt("The contract liability indemnification clause breach")
+        self.assertTrue(tax.startswith(llm._SYSTEM_PROMPT))
+        self.assertTrue(auto.startswith(llm._SYSTEM_PROMPT))
+        self.assertIn("**Expert analysis by: contract law specialist** (auto-detected)", auto)
+
     def test_validate_endpoint_valid(self):
         """Test valid endpoints."""
         try:
@@ -56,6 +87,170 @@ class TestLLM(unittest.TestCase):
         except ValueError:
             self.fail("Local endpoints raised ValueError when allow_local=True")
 
+    def test_validate_endpoint_metadata_blocked_when_local(self):
+        """Test that metadata and unspecified addresses stay blocked with allow_local."""
+        for url in ("http://0.0.0.0:11434", "http://[::]:11434", "http://2852039166/",
+                    "http://100.100.100.200/latest/meta-data/",
+                    # IPv4-mapped IPv6 spellings of the metadata addresses
+                    "http://[::ffff:169.254.169.254]/api", "http://[::ffff:100.100.100.200]/api"):
+            with self.assertRaises(ValueError, msg=url):
+                llm._validate_endpoint(url, allow_local=True)
+        # Ordinary hosts that merely start with "0" are not caught any more
+        infos = [(2, 1, 6, "", ("93.184.216.34", 443))]
+        with patch.object(llm, "_resolve", return_value=infos):
+            llm._validate_endpoint("https://0day.example/v1")
+
+    def test_resolve_cached(self):
+        """Test that repeated lookups of the same host reuse one DNS answer."""
+        infos = [(2, 1, 6, "", ("93.184.216.34", 443))]
+        llm._dns_cache.clear()
+        with patch.object(llm.socket, "getaddrinfo", return_value=infos) as lookup:
+            llm._validate_endpoint("https://cached.example/v1")
+            llm._validate_endpoint("https://cached.example/v2")
+        self.assertEqual(lookup.call_count, 1)
+        llm._dns_cache.clear()
+
+    def test_safe_llm_request_keepalive(self):
+        """Test pooled connection reuse, gzip replies, refused redirects and pinned addresses."""
+        import gzip
+        import socket
+        peers, hosts = set(), set()
+
+        class Handler(QuietHandler):
+            def do_POST(self):
+                peers.add(self.client_address)
+                hosts.add(self.headers["Host"])
+                self.rfile.read(int(self.headers["Content-Length"]))
+                status, body = (302, b"") if self.path == "/redirect" else (200, b'{"ok": 1}')
+                self.send_response(status)
+                if "gzip" in self.headers.get("Accept-Encoding", ""):
+                    body = gzip.compress(body)
+                    self.send_header("Content-Encoding", "gzip")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        base = self.serve(Handler)
+        for _ in range(3):
+            self.assertEqual(llm._safe_llm_request(base + "/chat", b"{}", {}), b'{"ok": 1}')
+        self.assertEqual(len(peers), 1)
+        with self.assertRaises(ValueError):
+            llm._safe_llm_request(base + "/redirect", b"{}", {})
+        # New connections dial the cached, vetted address; Host keeps the name
+        port = int(base.rsplit(":", 1)[1])
+        infos = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port))]
+        with patch.object(llm.socket, "getaddrinfo", return_value=infos):
+            llm._safe_llm_request(f"http://llm.test:{port}/chat", b"{}", {})
+        self.assertIn(f"llm.test:{port}", hosts)
+
+    def test_connect_dials_vetted_addresses(self):
+        """Test that new connections dial the validated addresses, never a fresh lookup."""
+        import socket
+
+        class Handler(QuietHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+        port = int(self.serve(Handler).rsplit(":", 1)[1])
+        url = f"http://pinned.test:{port}/chat"
+        vetted = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("127.0.0.1", port))]
+        rebound = [(socket.AF_INET, socket.SOCK_STREAM, 6, "", ("169.254.169.254", port))]
+        llm._dns_cache.clear()
+        with patch.object(llm.socket, "getaddrinfo", return_value=vetted):
+            addresses = llm._validate_endpoint(url, allow_local=True)
+        llm._dns_cache.clear()  # the DNS TTL runs out before the request connects
+        with patch.object(llm.socket, "getaddrinfo", return_value=rebound) as lookup:
+            self.assertEqual(llm._safe_llm_request(url, b"{}", {}, addresses=addresses), b"{}")
+        lookup.assert_not_called()
+        for conn, _ in llm._pool.pop(llm._pool_key(llm._parse_url(url)), []):
+            conn.close()
+
+    def test_safe_llm_request_retries_transient(self):
+        """Test that 429/5xx replies are retried with backoff on the same connection."""
+        statuses = [429, 503, 200]
+        peers, bodies = set(), []
+
+        class Handler(QuietHandler):
+            def do_POST(self):
+                peers.add(self.client_address)
+                bodies.append(self.rfile.read(int(self.headers["Content-Length"])))
+                status = statuses.pop(0) if statuses else 500
+                body = b'{"ok": 1}' if status == 200 else b"busy"
+                self.send_response(status)
+                if status == 429:
+                    self.send_header("Retry-After", "7")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        base = self.serve(Handler)
+        with patch.object(llm.time, "sleep") as sleep:
+            self.assertEqual(llm._safe_llm_request(base + "/chat", b"{}", {}), b'{"ok": 1}')
+            self.assertEqual(sleep.call_args_list[0].args, (7.0,))  # Retry-After
+            self.assertTrue(2 <= sleep.call_args_list[1].args[0] < 3)  # backoff
+            self.assertEqual(bodies, [b"{}"] * 3)
+            self.assertEqual(len(peers), 1)
+            with self.assertRaises(ValueError):  # gives up after _RETRY_ATTEMPTS sends
+                llm._safe_llm_request(base + "/chat", b"{}", {})
+            self.assertEqual(len(bodies), 3 + llm._RETRY_ATTEMPTS)
+            # A wait that would run past the deadline is not started
+            statuses.append(429)
+            sleep.reset_mock()
+            with patch.object(llm, "_RETRY_DEADLINE", 5.0), self.assertRaises(ValueError):
+                llm._safe_llm_request(base + "/chat", b"{}", {})
+            sleep.assert_not_called()
+        self.assertEqual(len(bodies), 3 + llm._RETRY_ATTEMPTS + 1)
+
+    def test_streamed_reports(self):
+        """Test SSE and NDJSON streaming through on_chunk."""
+        sse = (b'data: {"choices": [{"delta": {"role": "assistant"}}]}\n\n'
+               b'data: {"choices": [{"delta": {"content": "Hel"}}]}\n\n'
+               b'data: {"choices": [{"delta": {"content": "lo"}}]}\n\n'
+               b'data: [DONE]\n\n')
+        ndjson = (b'{"message": {"content": "Hel"}, "done": false}\n'
+                  b'{"message": {"content": "lo"}, "done": false}\n'
+                  b'{"done": true}\n')
+
+        class Handler(QuietHandler):
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                stream = sse if self.path == "/v1/chat/completions" else ndjson
+                self.send_response(200)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for line in stream.splitlines(keepends=True):
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.write(b"0\r\n\r\n")
+
+        base = self.serve(Handler)
+        for provider, endpoint in (("lmstudio", base + "/v1/chat/completions"), ("ollama", base)):
+            chunks = []
+            report = llm._PROVIDERS[provider]({"endpoint": endpoint}, "sys", "user", on_chunk=chunks.append)
+            self.assertEqual(chunks, ["Hel", "lo"])
+            self.assertEqual(report, "Hello")
+
+    def test_prewarm_pools_connection(self):
+        """Test that prewarm leaves one idle connection in the pool."""
+        import socket
+        listener = socket.create_server(("127.0.0.1", 0))
+        url = f"http://127.0.0.1:{listener.getsockname()[1]}"
+        try:
+            llm.prewarm("ollama", {"endpoint": url})
+            key = llm._pool_key(llm._parse_url(url))
+            self.assertEqual(len(llm._pool.get(key, [])), 1)
+            conn, idle_since = llm._pool[key][0]
+            llm.prewarm("ollama", {"endpoint": url})  # already warm: left untouched
+            self.assertEqual(llm._pool[key], [(conn, idle_since)])  # idle time not refreshed
+            llm.prewarm("openai", {"endpoint": url})  # loopback blocked: silently skipped
+        finally:
+            for conn, _ in llm._pool.pop(key, []):
+                conn.close()
+            listener.close()
+
     def test_validate_endpoint_schemes(self):
         """Test invalid schemes."""
         with self.assertRaises(ValueError):
@@ -63,6 +258,156 @@ class TestLLM(unittest.TestCase):
         with self.assertRaises(ValueError):
             llm._validate_endpoint("file:///etc/passwd")
 
+    def test_truncate_diff(self):
+        """Test that long diffs keep whole head and tail lines around a marker."""
+        diff = "\n".join(f"+line {i:03d}" for i in range(100))
+        self.assertIs(llm._truncate_diff(diff, len(diff)), diff)
+        short = llm._truncate_diff(diff, 200)
+        lines = short.split("\n")
+        self.assertEqual(lines[0], "+line 000")
+        self.assertEqual(lines[-1], "+line 099")
+        marker = next(line for line in lines if "omitted" in line)
+        kept = len(lines) - 1
+        self.assertEqual(marker, f"... [{100 - kept} lines omitted] ...")
+
+    def test_cap_diff_token_budget(self):
+        """Test that MAX_DIFF_TOKENS shrinks the diff to fit the token budget."""
+        from unittest.mock import MagicMock
+        encoding = MagicMock()
+        encoding.encode.side_effect = lambda text, **kw: text.split()
+        diff = "\n".join(f"+word {i:03d}" for i in range(100))  # 200 "tokens"
+        with patch.object(llm, "tiktoken", object()), patch.object(llm, "_token_encoding", lambda: encoding):
+            with patch.object(llm, "MAX_DIFF_TOKENS", 0):
+                self.assertIs(llm._cap_diff(diff), diff)
+            with patch.object(llm, "MAX_DIFF_TOKENS", 500):
+                self.assertIs(llm._cap_diff(diff), diff)
+            with patch.object(llm, "MAX_DIFF_TOKENS", 50):
+                capped = llm._cap_diff(diff)
+        self.assertIn("lines omitted", capped)
+        self.assertLessEqual(len(capped.split()), 60)
+        with patch.object(llm, "tiktoken", None), patch.object(llm, "MAX_DIFF_TOKENS", 50):
+            self.assertIs(llm._cap_diff(diff), diff)  # tiktoken not installed
+
+        # Token-dense head and tail around a sparse middle: the first
+        # proportional cut still overshoots, so the diff is cut again
+        dense = "\n".join("+a b c d e f g h" for _ in range(10))
+        sparse = "\n".join("+" + "x" * 40 for _ in range(200))
+        diff = "\n".join((dense, sparse, dense))
+        encoding.encode.reset_mock()
+        with patch.object(llm, "tiktoken", object()), patch.object(llm, "_token_encoding", lambda: encoding), \
+                patch.object(llm, "MAX_DIFF_TOKENS", 100):
+            capped = llm._cap_diff(diff)
+        self.assertGreater(encoding.encode.call_count, 2)
+        self.assertLessEqual(len(capped.split()), 100)
+
+    def test_agenerate_llm_report_concurrent(self):
+        """Test that async reports for several providers run concurrently."""
+        import asyncio
+        # Each call returns only once all three are in flight at the same time
+        barrier = threading.Barrier(3, timeout=5)
+
+        def slow_call(config, system, user):
+            barrier.wait()
+            return config["model"]
+
+        stats = {"equal": 1, "insert": 0, "delete": 0, "replace": 0}
+
+        async def run():
+            return await asyncio.gather(*(
+                llm.agenerate_llm_report(name, {"model": name}, "-a\n+b", stats, "a.pdf", "b.pdf")
+                for name in ("openai", "gemini", "ollama")
+            ))
+
+        with patch.dict(llm._PROVIDERS, {name: slow_call for name in ("openai", "gemini", "ollama")}):
+            reports = asyncio.run(run())
+        self.assertEqual(reports, ["openai", "gemini", "ollama"])
+
+    def test_generate_llm_reports_parallel(self):
+        """Test that parallel reports run concurrently and keep per-provider errors."""
+        # Each call returns only once both are in flight at the same time
+        barrier = threading.Barrier(2, timeout=5)
+
+        def slow_call(config, system, user):
+            barrier.wait()
+            return config["model"]
+
+        stats = {"equal": 1, "insert": 0, "delete": 0, "replace": 0}
+        with patch.dict(llm._PROVIDERS, {"openai": slow_call, "gemini": slow_call}):
+            results = llm.generate_llm_reports_parallel(
+                [("openai", {"model": "m1"}), ("gemini", {"model": "m2"}), ("nope", {})],
+                "-a\n+b", stats, "a.pdf", "b.pdf",
+            )
+        self.assertEqual((results["openai"], results["gemini"]), ("m1", "m2"))
+        self.assertIsInstance(results["nope"], ValueError)
+
+    def test_report_cache(self):
+        """Test that identical report requests are served from the cache."""
+        calls = []
+
+        def fake_call(config, system, user):
+            calls.append(config["model"])
+            return f"report {len(calls)}"
+
+        stats = {"equal": 1, "insert": 0, "delete": 0, "replace": 0}
+        llm._report_cache.clear()
+        with patch.dict(llm._PROVIDERS, {"openai": fake_call}), patch.object(llm, "LLM_CACHE_TTL", 60):
+            first = llm.generate_llm_report("openai", {"model": "m"}, "-a\n+b", stats, "a.pdf", "b.pdf")
+            again = llm.generate_llm_report("openai", {"model": "m"}, "-a\n+b", stats, "a.pdf", "b.pdf")
+            other = llm.generate_llm_report("openai", {"model": "n"}, "-a\n+b", stats, "a.pdf", "b.pdf")
+        llm._report_cache.clear()
+        self.assertEqual((first, again, other), ("report 1", "report 1", "report 2"))
+        self.assertEqual(calls, ["m", "n"])
+
+    def test_dumps_compact_utf8(self):
+        """Test request bodies are compact UTF-8 JSON, even with lone surrogates."""
+        self.assertEqual(llm._dumps({"text": "Größe"}), '{"text":"Größe"}'.encode())
+        self.assertEqual(llm._dumps({"text": "a\ud800b"}), b'{"text":"a?b"}')
+
+    def test_gzip_requests(self):
+        """Test that large cloud request bodies are gzipped only when enabled."""
+        import gzip
+        sent = []
+        reply = b'{"choices":[{"message":{"content":"ok"}}]}'
+        fake = lambda url, body, headers, **kwargs: sent.append((body, headers)) or reply
+        body = b"x" * 4096
+        keys = ("choices", 0, "message", "content")
+        with patch.object(llm, "_safe_llm_request", fake), patch.object(llm, "LLM_GZIP_REQUESTS", True):
+            llm._post_for_text("https://api.test/v1", body, {}, keys, keys, None, compress=True)
+            llm._post_for_text("https://api.test/v1", b"{}", {}, keys, keys, None, compress=True)
+            llm._post_for_text("http://localhost:1234/v1", body, {}, keys, keys, None)
+        self.assertEqual(gzip.decompress(sent[0][0]), body)
+        self.assertEqual(sent[0][1]["Content-Encoding"], "gzip")
+        self.assertNotIn("Content-Encoding", sent[1][1])  # below _GZIP_MIN_BODY
+        self.assertEqual(sent[2][0], body)  # local providers are never compressed
+
+    def test_report_cache_key_normalised(self):
+        """Test that diffs differing only in spacing share a cache key, but not moved ones."""
+        config = {"model": "m"}
+        a = "## Unified Diff\n```\n@@ -1,3 +1,3 @@\n-old  text\n+new text\n```\n"
+        b = "## Unified Diff\n```\n@@ -1,3 +1,3 @@\n-old text\n+new   text\n```\n"
+        c = "## Unified Diff\n```\n@@ -1,3 +1,3 @@\n-old text\n+other text\n```\n"
+        moved = "## Unified Diff\n```\n@@ -40,3 +41,3 @@\n-old text\n+new text\n```\n"
+        key = llm._report_cache_key("openai", config, "sys", a)
+        self.assertEqual(key, llm._report_cache_key("openai", config, "sys", b))
+        self.assertNotEqual(key, llm._report_cache_key("openai", config, "sys", c))
+        # Reports cite line numbers, so the same change elsewhere needs its own report
+        self.assertNotEqual(key, llm._report_cache_key("openai", config, "sys", moved))
+
+    def test_report_cache_on_disk(self):
+        """Test that cached reports are read back from LLM_CACHE_DIR after a restart."""
+        import tempfile
+        import time
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                patch.object(llm, "LLM_CACHE_TTL", 60), patch.object(llm, "LLM_CACHE_DIR", cache_dir):
+            llm._report_cache_put("k" * 64, "# Report")
+            llm._report_cache.clear()  # as if the process had restarted
+            self.assertEqual(llm._report_cache_get("k" * 64), "# Report")
+            self.assertIsNone(llm._report_cache_get("m" * 64))
+            llm._report_cache.clear()
+            with patch.object(llm.time, "time", return_value=time.time() + 120):
+                self.assertIsNone(llm._report_cache_get("k" * 64))  # expired
+        llm._report_cache.clear()
+
     def test_extract_response_valid(self):
         """Test robust JSON response extraction."""
         data = {"choices": [{"message": {"content": "Hello"}}]}